@@ -7,13 +7,18 @@ set -euo pipefail
 # This script copies the production database to a local file
 # Then it can be copied over db.sqlite and committed
 #
-# Local edits can be copied back to prod if desired:
+# Local edits can be copied back to prod if desired. Stop parity-server first
+# and remove the db.sqlite-wal and db.sqlite-shm files next to it:
 # scp -r ./server/db.sqlite parity-server:/home/ubuntu/parity-server/server/
 
 copy-db() {
   remote="$1"
   thisdir="$(dirname $(readlink -f "${BASH_SOURCE[0]}"))"
-  scp $remote:~/parity-server/server/db.sqlite $thisdir/../server/prod.sqlite
+
+  # db.sqlite alone can be stale or torn while the server is writing to the WAL
+  ssh "$remote" "sqlite3 ~/parity-server/server/db.sqlite '.backup /tmp/parity-copy.sqlite'"
+  scp $remote:/tmp/parity-copy.sqlite $thisdir/../server/prod.sqlite
+  ssh "$remote" "rm /tmp/parity-copy.sqlite"
 }
 
 if [[ $# -eq 0 ]] ; then
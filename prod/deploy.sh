@@ -14,6 +14,7 @@ deploy () {
 
   # build frontend
   (cd $thisdir/../web && yarn build)
+  (cd $thisdir/.. && uv run python -m server.static web/build)
 
   # copy caddyfile
   # caddy will reload on changes
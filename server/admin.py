@@ -1,10 +1,12 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from sqlmodel import Session, col, select
+from sqlmodel import Session, col, delete, select
 import os
 
 from server.stats_calculator import StatsCalculator
+import server.aggregates as aggregates
 import server.api as api
+import server.cache as cache
 import server.db as db
 
 security = HTTPBasic()
@@ -45,10 +47,19 @@ def edit_game(
     game_id: int,
     edited_game: EditedGame,
 ):
-    game = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.id == game_id)).first()
+    game = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.id == game_id).options(db.without_points())).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
+    # clear the stats cache. writing first holds the league's write lock
+    # so another upload can't change the totals between reading and updating them
+    cache.bump_version(session, league_id)
+
+    # remove the old stats from the totals before the week can change
+    stats = session.exec(select(db.Stats).where(db.Stats.game_id == game.id)).all()
+    session.execute(delete(db.Stats).where(col(db.Stats.game_id) == game.id))
+    aggregates.remove_game(session, game, stats)
+
     # updating Game
     game.home_score = edited_game.home_score
     game.away_score = edited_game.away_score
@@ -58,39 +69,27 @@ def edit_game(
     game.week = edited_game.week
 
     session.add(game)
-    session.commit()
-
-    # loading other games from the same week
-    games = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.week == game.week)).all()
-    game_ids = [game.id for game in games]
-
-    # deleting old stats
-    stats = session.exec(select(db.Stats).where(col(db.Stats.game_id).in_(game_ids))).all()
 
-    for stat in stats:
-        session.delete(stat)
+    # re-calculating stats for this game only
+    StatsCalculator(game).run(session)
     session.commit()
 
-    # re-calculating stats
-    for game in games:
-        StatsCalculator(game).run(session)
-
-    # clear the stats cache
-
     return
 
 
 def delete_game(session: Session, league_id: int, game_id: int):
-    game = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.id == game_id)).first()
+    game = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.id == game_id).options(db.without_points())).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    for stat in game.stats:
-        session.delete(stat)
+    # clear the stats cache first to hold the write lock, as in edit_game
+    cache.bump_version(session, league_id)
 
-    session.delete(game)
-    session.commit()
+    stats = session.exec(select(db.Stats).where(db.Stats.game_id == game.id)).all()
+    session.execute(delete(db.Stats).where(col(db.Stats.game_id) == game.id))
+    aggregates.remove_game(session, game, stats)
 
-    # clear the stats cache
+    session.execute(delete(db.Game).where(col(db.Game.id) == game.id))
+    session.commit()
 
     return
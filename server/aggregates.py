@@ -0,0 +1,278 @@
+from functools import reduce
+from sqlalchemy import ColumnElement, and_, case, func
+from sqlmodel import Session, col, delete, select
+from typing import Collection, Optional, Sequence
+import operator
+import sqlalchemy
+import sys
+
+import server.db as db
+
+COUNTING_STATS = [
+    "goals",
+    "assists",
+    "second_assists",
+    "d_blocks",
+    "completions",
+    "throw_aways",
+    "threw_drops",
+    "catches",
+    "drops",
+    "pulls",
+    "callahan",
+    "o_points_for",
+    "o_points_against",
+    "d_points_for",
+    "d_points_against",
+]
+
+AVERAGED_STATS = [
+    "pay",
+    "salary_per_point",
+    "o_efficiency",
+    "d_efficiency",
+    "total_efficiency",
+]
+
+
+def player_team(player: db.Player, game: db.Game, team_names: dict[int, str]) -> str:
+    """The team a player played for in a game."""
+    if player.name in game.home_roster:
+        return game.home_team
+    elif player.name in game.away_roster:
+        return game.away_team
+    elif player.team_id:
+        return team_names[player.team_id]
+    else:
+        return "Unknown"
+
+
+def add_game(session: Session, game: db.Game, stats: Collection[db.Stats]):
+    """Update the season and week totals of the players in a newly saved game.
+
+    Does not commit so the totals are saved in the same
+    transaction as the stats themselves.
+    """
+    apply_game(session, game, stats)
+
+
+def remove_game(session: Session, game: db.Game, stats: Collection[db.Stats]):
+    """Update the season and week totals of the players in a removed game.
+
+    Must be called after the game's stats are deleted.
+    """
+    apply_game(session, game, stats)
+
+
+def apply_game(session: Session, game: db.Game, stats: Collection[db.Stats]):
+    if not stats:
+        return
+
+    # totals that were never built are built from the stats as they are now
+    if not totals_built(session, game.league_id):
+        build_totals(session, game.league_id)
+        return
+
+    refresh_players(session, game.league_id, {s.player_id for s in stats})
+
+
+def refresh_players(session: Session, league_id: int, player_ids: Collection[int]):
+    """Recompute some players' season and week totals from their Stats.
+
+    The totals are summed by the same SQL as rebuild instead of adding and
+    subtracting each game so the averaged (float) stats never drift from it.
+    """
+    session.execute(delete(db.PlayerSeasonStats).where(col(db.PlayerSeasonStats.league_id) == league_id, col(db.PlayerSeasonStats.player_id).in_(player_ids)))
+    session.execute(delete(db.PlayerWeekStats).where(col(db.PlayerWeekStats.league_id) == league_id, col(db.PlayerWeekStats.player_id).in_(player_ids)))
+
+    insert_totals(session, league_id, player_ids)
+
+
+def round_div(numerator: ColumnElement, denominator: ColumnElement) -> ColumnElement:
+    """SQL for python's round(numerator / denominator) on integers.
+
+    Python rounds halves to even while SQL ROUND rounds them away from
+    zero so this works from the truncated quotient and remainder
+    (SQLite and Postgres truncate integer division towards zero).
+    """
+    quotient = numerator // denominator
+    remainder = numerator % denominator
+
+    floor = case((remainder < 0, quotient - 1), else_=quotient)
+    twice_fraction = 2 * case((remainder < 0, remainder + denominator), else_=remainder)
+
+    round_up = case(
+        (twice_fraction > denominator, 1),
+        (and_(twice_fraction == denominator, floor % 2 != 0), 1),
+        else_=0,
+    )
+
+    return case((denominator == 0, 0), else_=floor + round_up)
+
+
+def efficiency(points_for, points_played) -> ColumnElement:
+    return case((points_played == 0, 0.0), else_=points_for / points_played)
+
+
+def stats_pay() -> ColumnElement:
+    """SQL for Stats.pay using the stat values each row was recorded with."""
+    return case(
+        *[
+            (col(db.Stats.stat_values) == version, reduce(operator.add, [col(getattr(db.Stats, stat)) * value for stat, value in values.items()]))
+            for version, values in db.STAT_VALUES.items()
+        ],
+        else_=0,
+    )
+
+
+def stats_points_played() -> ColumnElement:
+    """SQL for Stats.points_played."""
+    return col(db.Stats.o_points_for) + col(db.Stats.o_points_against) + col(db.Stats.d_points_for) + col(db.Stats.d_points_against)
+
+
+def sum_stats_statement(league_id: int, week: int = 0, by_week: bool = False, player_ids: Optional[Collection[int]] = None) -> sqlalchemy.Select:
+    """Aggregate Stats rows per player (and week) in a single GROUP BY query.
+
+    Produces the same sums as adding each game's stats to the totals.
+    """
+    stats = {stat: col(getattr(db.Stats, stat)) for stat in COUNTING_STATS}
+
+    o_points_played = stats["o_points_for"] + stats["o_points_against"]
+    d_points_played = stats["d_points_for"] + stats["d_points_against"]
+    points_played = o_points_played + d_points_played
+
+    game_stats = (
+        sqlalchemy.select(
+            col(db.Stats.player_id),
+            col(db.Game.week),
+            *stats.values(),
+            stats_pay().label("pay"),
+            points_played.label("points_played"),
+            efficiency(stats["o_points_for"], o_points_played).label("o_efficiency"),
+            efficiency(stats["d_points_for"], d_points_played).label("d_efficiency"),
+            efficiency(stats["o_points_for"] + stats["d_points_for"], points_played).label("total_efficiency"),
+        )
+        .join(db.Game)
+        .where(col(db.Stats.league_id) == league_id)
+    )
+
+    if week:
+        game_stats = game_stats.where(col(db.Game.week) == week)
+    if player_ids is not None:
+        game_stats = game_stats.where(col(db.Stats.player_id).in_(player_ids))
+
+    rows = game_stats.subquery("game_stats")
+    group_by = [rows.c.player_id, rows.c.week] if by_week else [rows.c.player_id]
+
+    return (
+        sqlalchemy.select(
+            *group_by,
+            *[func.sum(rows.c[stat]).label(stat) for stat in COUNTING_STATS],
+            func.count().label("games_played"),
+            func.sum(rows.c.pay).label("pay"),
+            func.sum(round_div(rows.c.pay, rows.c.points_played)).label("salary_per_point"),
+            func.sum(rows.c.o_efficiency).label("o_efficiency"),
+            func.sum(rows.c.d_efficiency).label("d_efficiency"),
+            func.sum(rows.c.total_efficiency).label("total_efficiency"),
+        )
+        .group_by(*group_by)
+        .order_by(*group_by)
+    )
+
+
+def sum_stats(
+    session: Session, league_id: int, week: int = 0, by_week: bool = False, player_ids: Optional[Collection[int]] = None
+) -> Sequence[tuple[dict, db.Player]]:
+    """Totals for every player (or only player_ids) computed with SQL instead of loading games.
+
+    Returns the summed values (as dicts ready for a StatTotals) along
+    with each player. With by_week each player has a row per week.
+    """
+    rows = session.execute(sum_stats_statement(league_id, week, by_week, player_ids)).mappings().all()
+    if not rows:
+        return []
+
+    # the team comes from the latest game for each player (and week), ranked in SQL
+    partition_by = [col(db.Stats.player_id), col(db.Game.week)] if by_week else [col(db.Stats.player_id)]
+    latest_rank = func.row_number().over(partition_by=partition_by, order_by=[col(db.Game.week).desc(), col(db.Game.id).desc()])
+    ranked = (
+        sqlalchemy.select(col(db.Stats.player_id), col(db.Stats.game_id), latest_rank.label("rank")).join(db.Game).where(col(db.Stats.league_id) == league_id)
+    )
+    if week:
+        ranked = ranked.where(col(db.Game.week) == week)
+    if player_ids is not None:
+        ranked = ranked.where(col(db.Stats.player_id).in_(player_ids))
+    latest = ranked.subquery("latest")
+
+    latest_statement = (
+        select(latest.c.player_id, db.Game).join(db.Game, col(db.Game.id) == latest.c.game_id).where(latest.c.rank == 1).options(db.without_points())
+    )
+    latest_games = {}
+    for player_id, game in session.exec(latest_statement).all():
+        latest_games[(player_id, game.week) if by_week else player_id] = game
+
+    players_statement = select(db.Player).where(db.Player.league_id == league_id)
+    if player_ids is not None:
+        players_statement = players_statement.where(col(db.Player.id).in_(player_ids))
+    players = {p.id: p for p in session.exec(players_statement).all()}
+    team_names = dict(session.exec(select(db.Team.id, db.Team.name).where(db.Team.league_id == league_id)).all())
+
+    totals = []
+    for row in rows:
+        data = dict(row)
+        player = players[data.pop("player_id")]
+        game = latest_games[(player.id, data["week"]) if by_week else player.id]
+
+        data["team"] = player_team(player, game, team_names)
+        data["last_game_week"] = game.week
+        data["last_game_id"] = game.id
+        totals.append((data, player))
+
+    return totals
+
+
+def totals_built(session: Session, league_id: int) -> bool:
+    return session.exec(select(db.LeagueTotals.league_id).where(db.LeagueTotals.league_id == league_id)).first() is not None
+
+
+def rebuild(session: Session, league_id: int):
+    """Recompute the totals for a league from scratch."""
+    build_totals(session, league_id)
+    session.commit()
+
+
+def build_totals(session: Session, league_id: int):
+    """Replace a league's totals with sums of its Stats and mark them built. Does not commit."""
+    session.execute(delete(db.PlayerSeasonStats).where(col(db.PlayerSeasonStats.league_id) == league_id))
+    session.execute(delete(db.PlayerWeekStats).where(col(db.PlayerWeekStats.league_id) == league_id))
+    insert_totals(session, league_id)
+
+    if not totals_built(session, league_id):
+        session.add(db.LeagueTotals(league_id=league_id))
+
+
+def insert_totals(session: Session, league_id: int, player_ids: Optional[Collection[int]] = None):
+    season_totals = [{"league_id": league_id, "player_id": player.id, **data} for data, player in sum_stats(session, league_id, player_ids=player_ids)]
+    if season_totals:
+        session.execute(sqlalchemy.insert(db.PlayerSeasonStats), season_totals)
+
+    week_totals = [
+        {"league_id": league_id, "player_id": player.id, **data} for data, player in sum_stats(session, league_id, by_week=True, player_ids=player_ids)
+    ]
+    if week_totals:
+        session.execute(sqlalchemy.insert(db.PlayerWeekStats), week_totals)
+
+
+if __name__ == "__main__":
+    engine = db.get_engine()
+    db.create_tables(engine)
+
+    # --missing only builds leagues whose totals were never built
+    missing = "--missing" in sys.argv
+
+    with Session(engine) as session:
+        for league in session.exec(select(db.League)).all():
+            if missing and totals_built(session, league.id):
+                continue
+            print(f"Rebuilding stats totals for {league.name}")
+            rebuild(session, league.id)
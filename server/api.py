@@ -1,16 +1,24 @@
 from fastapi import HTTPException
 from pydantic import BaseModel, ConfigDict
 from pydantic.alias_generators import to_camel
-from sqlalchemy.orm import InstrumentedAttribute, selectinload
 from sqlmodel import Session, col, select
-from typing import Collection, Optional, cast
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import AsyncIterator, Collection, Optional, Sequence
 import datetime
+import os
 
 from server.stats_calculator import StatsCalculator
+import server.aggregates as aggregates
+import server.cache as cache
 import server.db as db
+import server.salary as salary
+import server.serialization as serialization
 
 CURRENT_LEAGUE_ID = 24
 
+# games fetched from the cursor at a time when exporting a league
+EXPORT_BATCH_SIZE = 20
+
 
 def alias_generator(key: str) -> str:
     """Convert some fields to camelCase.
@@ -174,166 +182,181 @@ def current_league(session: Session) -> CurrentLeague:
 def upload_game(session: Session, uploaded_game: UploadedGame):
     game = db.Game(**uploaded_game.model_dump())
 
+    # clear the stats cache. writing first holds the league's write lock
+    # so an edit can't change the totals between reading and updating them
+    cache.bump_version(session, game.league_id)
+
     # save the game to the database
     session.add(game)
-    session.commit()
+    session.flush()
 
     # calculate and save stats
     StatsCalculator(game).run(session)
-
-    # clear the stats cache
+    session.commit()
 
 
-def build_leagues_response(session: Session) -> list[League]:
-    leagues = session.exec(select(db.League)).all()
+async def build_leagues_response(session: AsyncSession) -> list[League]:
+    leagues = (await session.exec(select(db.League))).all()
     return [League(**league.model_dump()) for league in leagues]
 
 
-def build_weeks_response(session: Session, league_id: int) -> list[int]:
-    weeks = set(session.exec(select(db.Game.week).where(db.Game.league_id == league_id)).all())
+async def build_weeks_response(session: AsyncSession, league_id: int) -> list[int]:
+    weeks = set((await session.exec(select(db.Game.week).where(db.Game.league_id == league_id))).all())
     return sorted(weeks)
 
 
-def build_games_response(session: Session, league_id: int, include_points: bool) -> list[Game]:
+def trusted_reads() -> bool:
+    """PARITY_TRUSTED_READS skips validating stored games on read.
+
+    Points are validated when a game is uploaded or edited so by default the
+    stored JSON is passed through instead of rebuilding every Point and Event.
+    """
+    return os.environ.get("PARITY_TRUSTED_READS", "true").lower() == "true"
+
+
+def game_json(game: dict) -> dict:
+    """A stored game keyed like the Game schema's JSON without validating it."""
+    return {field.alias or name: game.get(name) for name, field in Game.model_fields.items()}
+
+
+async def build_games_response(session: AsyncSession, league_id: int) -> list[Game] | list[dict]:
+    connection = await session.connection()
+    rows = [dict(row) for row in (await connection.execute(select(*db.GAME_SUMMARY_COLUMNS).where(db.Game.league_id == league_id))).mappings().all()]
+    return games_json(rows)
+
+
+def build_games_with_points_response(session: Session, league_id: int) -> list[Game] | list[dict]:
     games = session.exec(select(db.Game).where(db.Game.league_id == league_id)).all()
-    if include_points:
-        return [Game(**g.model_dump()) for g in games]
-    else:
-        return [Game(**g.model_dump(exclude={"points"})) for g in games]
+    return games_json([g.model_dump() for g in games])
+
+
+def games_json(rows: list[dict]) -> list[Game] | list[dict]:
+    if trusted_reads():
+        return [game_json(row) for row in rows]
+    return [Game(**row) for row in rows]
+
 
+async def stream_games_export(league_id: int) -> AsyncIterator[bytes]:
+    """Every game in a league with points, one JSON document per line.
 
-def build_game_response(session: Session, league_id: int, game_id: int) -> GameWithStats:
+    Games are read from a streaming cursor in batches so memory stays flat
+    no matter how many games the league has.
+    """
+    trusted = trusted_reads()
+    statement = select(*db.GAME_COLUMNS).where(db.Game.league_id == league_id).order_by(col(db.Game.id)).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    async with db.get_async_engine().connect() as connection:
+        result = await connection.stream(statement)
+        async for row in result.mappings():
+            game = game_json(dict(row)) if trusted else Game(**row)
+            yield serialization.dumps(game) + b"\n"
+
+
+def build_game_response(session: Session, league_id: int, game_id: int) -> GameWithStats | dict:
     game = session.exec(select(db.Game).where(db.Game.league_id == league_id, db.Game.id == game_id)).first()
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     stats = build_stats(session, league_id, [game])
+
+    if trusted_reads():
+        return {**game_json(game.model_dump()), "stats": stats}
     return GameWithStats(**game.model_dump(), stats=stats)
 
 
 def build_stats_response(session: Session, league_id: int, week: int) -> WeekStats:
-    if week == 0:
-        games = session.exec(
-            select(db.Game)
-            .where(db.Game.league_id == league_id)
-            .order_by(col(db.Game.week).asc())
-            .options(selectinload(cast(InstrumentedAttribute, db.Game.stats)))
+    totals: Sequence[tuple[db.StatTotals, str]]
+    if not aggregates.totals_built(session, league_id):
+        # leagues whose totals haven't been built yet are summed in SQL
+        totals = [(db.StatTotals(**data), player.name) for data, player in aggregates.sum_stats(session, league_id, week)]
+    elif week == 0:
+        totals = session.exec(
+            select(db.PlayerSeasonStats, db.Player.name)
+            .join(db.Player)
+            .where(db.PlayerSeasonStats.league_id == league_id)
+            .order_by(col(db.PlayerSeasonStats.id).asc())
         ).all()
     else:
-        games = session.exec(
-            select(db.Game).where(db.Game.league_id == league_id, db.Game.week == week).options(selectinload(cast(InstrumentedAttribute, db.Game.stats)))
+        totals = session.exec(
+            select(db.PlayerWeekStats, db.Player.name)
+            .join(db.Player)
+            .where(db.PlayerWeekStats.league_id == league_id, db.PlayerWeekStats.week == week)
+            .order_by(col(db.PlayerWeekStats.id).asc())
         ).all()
-    stats = build_stats(session, league_id, games)
+
+    stats = {name: stats_from_totals(t) for t, name in totals}
     return WeekStats(week=week, stats=stats)
 
 
+def stats_from_totals(totals: db.StatTotals) -> Stats:
+    data = totals.model_dump(include=set(aggregates.COUNTING_STATS) | {"team"})
+    games_played = totals.games_played
+
+    return Stats(
+        **data,
+        points_played=totals.o_points_for + totals.o_points_against + totals.d_points_for + totals.d_points_against,
+        pay=round(totals.pay / games_played),
+        salary_per_point=round(totals.salary_per_point / games_played),
+        o_efficiency=totals.o_efficiency / games_played,
+        d_efficiency=totals.d_efficiency / games_played,
+        total_efficiency=totals.total_efficiency / games_played,
+    )
+
+
 def build_stats(session: Session, league_id: int, games: Collection[db.Game]) -> dict[str, Stats]:
-    players = session.exec(select(db.Player).where(db.Player.league_id == league_id)).all()
-    teams = session.exec(select(db.Team).where(db.Team.league_id == league_id)).all()
+    players = {p.id: p for p in session.exec(select(db.Player).where(db.Player.league_id == league_id)).all()}
+    team_names = dict(session.exec(select(db.Team.id, db.Team.name).where(db.Team.league_id == league_id)).all())
 
     player_stats: dict = {}
 
-    stats_to_average = [
-        "pay",
-        "salary_per_point",
-        "o_efficiency",
-        "d_efficiency",
-        "total_efficiency",
-    ]
-
     # rollup stats per game
     for game in games:
+        home_roster = set(game.home_roster)
+        away_roster = set(game.away_roster)
+
         for game_stats in game.stats:
-            player = [p for p in players if p.id == game_stats.player_id][0]
+            player = players[game_stats.player_id]
             data = game_stats.model_dump()
 
             # aggregate all stats for the player
             if player.name in player_stats:
                 existing_data = player_stats[player.name]
                 summed_stats = {s: data.get(s, 0) + existing_data.get(s, 0) for s in data.keys()}
-                player_stats[player.name].update(summed_stats)
-                player_stats[player.name]["games_played"] += 1
+                existing_data.update(summed_stats)
+                existing_data["games_played"] += 1
             else:
-                player_stats.update({player.name: data})
-                player_stats[player.name]["games_played"] = 1
+                player_stats[player.name] = data
+                data["games_played"] = 1
 
             # set the team for the player
-            if player.name in game.home_roster:
+            if player.name in home_roster:
                 team = game.home_team
-            elif player.name in game.away_roster:
+            elif player.name in away_roster:
                 team = game.away_team
             elif player.team_id:
-                team = [t for t in teams if t.id == player.team_id][0].name
+                team = team_names[player.team_id]
             else:
                 team = "Unknown"
 
             player_stats[player.name]["team"] = team
 
             if player.gender:
-                player_stats[player.name].update({"gender": player.gender})
+                player_stats[player.name]["gender"] = player.gender
 
     # resolve averages
-    for player_name in player_stats.keys():
-        for stat in stats_to_average:
-            value = player_stats[player_name][stat]
-            games_played = player_stats[player_name]["games_played"]
-            player_stats[player_name][stat] = value / games_played
+    for data in player_stats.values():
+        games_played = data.pop("games_played")
+        for stat in aggregates.AVERAGED_STATS:
+            data[stat] = data[stat] / games_played
 
-        player_stats[player_name]["pay"] = round(player_stats[player_name]["pay"])
-        player_stats[player_name]["salary_per_point"] = round(player_stats[player_name]["salary_per_point"])
-        player_stats[player_name].pop("games_played")
+        data["pay"] = round(data["pay"])
+        data["salary_per_point"] = round(data["salary_per_point"])
 
     return {k: Stats(**v) for k, v in player_stats.items()}
 
 
-# teams gets queried more times than strictly necessary here
 def build_players_response(session, league_id) -> list[Player]:
-    league = session.get(db.League, league_id)
-    players = [p for p in league.players if p.team_id is not None]
-    stats = league.stats
-
-    # Calculate Salaries 👍
-    for player in players:
-        player_stats = [s for s in stats if s.player_id == player.id]
-
-        if len(player_stats) == 0:
-            continue
-
-        if league.salary_calc == "pro_rate":
-            salaries = [ps.salary_per_point for ps in player_stats if ps.points_played > 3]
-            if len(salaries) == 0:
-                continue
-            average_salary_per_point = sum(salaries) / len(salaries)
-
-            pro_rated_number_of_points = 15
-            pro_rated_salary = average_salary_per_point * pro_rated_number_of_points
-
-            player.salary = round(pro_rated_salary)
-
-        elif league.salary_calc == "sum":
-            base = 500000
-
-            earnings = [ps.pay for ps in player_stats]
-            total_earnings = sum(earnings)
-
-            player.salary = base + total_earnings
-
-    # Estimate Salaries 👎
-    male_salaries = [p.salary for p in players if p.is_open and p.salary]
-    female_salaries = [p.salary for p in players if not p.is_open and p.salary]
-
-    avg_male_salary = round(sum(male_salaries) / (len(male_salaries) or 1))
-    avg_female_salary = round(sum(female_salaries) / (len(female_salaries) or 1))
-
-    for player in players:
-        if player.salary is None:
-            if player.fallback_salary:
-                player.salary = player.fallback_salary
-            elif player.is_open:
-                player.salary = avg_male_salary
-            else:
-                player.salary = avg_female_salary
-
-    return [Player(name=p.name, team=p.team_name, salary=p.salary) for p in players]
+    players = salary.player_salaries(session, league_id)
+    return [Player(name=player.name, team=team_name, salary=player_salary) for player, team_name, player_salary in players]
 
 
 def build_teams_response(session: Session, league_id: int) -> list[Team]:
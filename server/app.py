@@ -1,16 +1,47 @@
-from fastapi import Depends, FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
 from pathlib import Path
 from sqlmodel import Session
-from starlette.responses import FileResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
 from typing import Annotated
+import anyio.to_thread
 import logging
+import os
 
 import server.admin as admin
 import server.api as api
+import server.cache as cache
+import server.compression as compression
 import server.db as db
+import server.serialization as serialization
+import server.static as static
+
+# Threadpool
+# Routes that use the sync database session are plain `def` so FastAPI runs
+# them in anyio's threadpool instead of blocking the event loop. The pool
+# size caps how many of those requests run at once per worker. Simple reads
+# use the async session and stay on the event loop.
+DEFAULT_THREADPOOL_SIZE = 40
+
+
+def threadpool_size() -> int:
+    return int(os.environ.get("PARITY_THREADPOOL_SIZE", DEFAULT_THREADPOOL_SIZE))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size()
+    db.create_tables()
+    yield
+    await db.dispose_async_engines()
+    db.dispose_engines()
+
 
 # Init
 app = FastAPI(
+    lifespan=lifespan,
     title="OCUA Parity League",
     summary="API Documentation",
     openapi_tags=[
@@ -20,30 +51,47 @@ app = FastAPI(
     ],
 )
 
+# Compression
+# games with points and stats are hundreds of KB of JSON. Uploads only
+# answer "OK" so they skip the middleware.
+app.add_middleware(
+    compression.CompressionMiddleware,
+    config=compression.config_from_env(),
+    routes={r"/submit_game$": None},
+)
+
 # Assets
 react_app_path = Path(__file__).parents[1] / "web/build"
 if not react_app_path.exists():
     print(f"Warning: React app directory not found at {react_app_path}")
+react_app = static.StaticIndex(react_app_path)
 
 # Logging
 logging.basicConfig()
 logger = logging.getLogger("sqlalchemy.engine")
 logger.setLevel(logging.WARN)  # INFO to see queries
+logging.getLogger("server").setLevel(logging.INFO)
 
 # Dependencies
 SessionDep = Annotated[Session, Depends(db.get_session)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(db.get_async_session)]
 AdminDep = Annotated[Session, Depends(admin.verify)]
 
 
+def archived(league_id: int) -> bool:
+    """Leagues before the current one. Only existing leagues are cached (see cache.cached_response)."""
+    return league_id < api.CURRENT_LEAGUE_ID
+
+
 # Current League
 @app.get("/current_league", tags=["android"])
-async def current_league(session: SessionDep) -> api.CurrentLeague:
+def current_league(session: SessionDep) -> api.CurrentLeague:
     return api.current_league(session)
 
 
 # Submit Game
 @app.post("/submit_game", status_code=201, tags=["android"])
-async def upload(session: SessionDep, uploaded_game: api.UploadedGame):
+def upload(session: SessionDep, uploaded_game: api.UploadedGame):
     """Upload a game recorded on the Android app."""
     api.upload_game(session, uploaded_game)
     return "OK"
@@ -51,37 +99,55 @@ async def upload(session: SessionDep, uploaded_game: api.UploadedGame):
 
 # API
 @app.get("/api/leagues", tags=["api"])
-async def leagues(session: SessionDep) -> list[api.League]:
-    return api.build_leagues_response(session)
+async def leagues(session: AsyncSessionDep) -> list[api.League]:
+    return await api.build_leagues_response(session)
 
 
 @app.get("/api/{league_id}/teams", tags=["api"])
-async def teams(session: SessionDep, league_id: int) -> list[api.Team]:
+def teams(session: SessionDep, league_id: int) -> list[api.Team]:
     return api.build_teams_response(session, league_id)
 
 
 @app.get("/api/{league_id}/schedule", tags=["android"])
-async def schedule(session: SessionDep, league_id: int) -> api.Schedule:
+def schedule(session: SessionDep, league_id: int) -> api.Schedule:
     return api.build_schedule_response(session, league_id)
 
 
-@app.get("/api/{league_id}/players", tags=["api"])
-async def players(session: SessionDep, league_id: int) -> list[api.Player]:
-    return api.build_players_response(session, league_id)
+@app.get("/api/{league_id}/players", tags=["api"], response_model=list[api.Player])
+def players(request: Request, session: SessionDep, league_id: int) -> Response:
+    return cache.cached_response(request, session, league_id, ("players",), lambda: api.build_players_response(session, league_id), archived(league_id))
+
+
+@app.get("/api/{league_id}/games", tags=["api"], response_model=list[api.Game])
+async def games(request: Request, session: AsyncSessionDep, sync_session: SessionDep, league_id: int, includePoints: bool = False) -> Response:
+    if includePoints:
+        # Decoding and serializing every point is CPU bound so it runs in the threadpool
+        return await run_in_threadpool(
+            cache.cached_response,
+            request,
+            sync_session,
+            league_id,
+            ("games", True),
+            lambda: api.build_games_with_points_response(sync_session, league_id),
+            archived(league_id),
+        )
+    return await cache.async_cached_response(
+        request, session, league_id, ("games", False), lambda: api.build_games_response(session, league_id), archived(league_id)
+    )
 
 
-@app.get("/api/{league_id}/games", tags=["api"])
-async def games(session: SessionDep, league_id: int, includePoints: bool = False) -> list[api.Game]:
-    return api.build_games_response(session, league_id, includePoints)
+@app.get("/api/{league_id}/games.ndjson", tags=["api"], response_class=StreamingResponse)
+async def games_export(league_id: int):
+    return StreamingResponse(api.stream_games_export(league_id), media_type="application/x-ndjson")
 
 
-@app.get("/api/{league_id}/games/{id}", tags=["api"])
-async def game(session: SessionDep, league_id: int, id: int) -> api.GameWithStats:
-    return api.build_game_response(session, league_id, id)
+@app.get("/api/{league_id}/games/{id}", tags=["api"], response_model=api.GameWithStats)
+def game(session: SessionDep, league_id: int, id: int) -> Response:
+    return serialization.json_response(api.build_game_response(session, league_id, id))
 
 
 @app.post("/api/{league_id}/games/{id}", tags=["admin"])
-async def update_game(
+def update_game(
     login: AdminDep,
     session: SessionDep,
     league_id: int,
@@ -93,31 +159,27 @@ async def update_game(
 
 
 @app.delete("/api/{league_id}/games/{id}", tags=["admin"])
-async def delete_game(login: AdminDep, session: SessionDep, league_id: int, id: int):
+def delete_game(login: AdminDep, session: SessionDep, league_id: int, id: int):
     admin.delete_game(session, league_id, id)
     return "OK"
 
 
-@app.get("/api/{league_id}/weeks", tags=["api"])
-async def weeks(session: SessionDep, league_id: int) -> list[int]:
-    return api.build_weeks_response(session, league_id)
+@app.get("/api/{league_id}/weeks", tags=["api"], response_model=list[int])
+async def weeks(request: Request, session: AsyncSessionDep, league_id: int) -> Response:
+    return await cache.async_cached_response(request, session, league_id, ("weeks",), lambda: api.build_weeks_response(session, league_id), archived(league_id))
 
 
-@app.get("/api/{league_id}/weeks/{week}", tags=["api"])
-async def week(session: SessionDep, league_id: int, week: int) -> api.WeekStats:
-    return api.build_stats_response(session, league_id, week)
+@app.get("/api/{league_id}/weeks/{week}", tags=["api"], response_model=api.WeekStats)
+def week(request: Request, session: SessionDep, league_id: int, week: int) -> Response:
+    return cache.cached_response(request, session, league_id, ("stats", week), lambda: api.build_stats_response(session, league_id, week), archived(league_id))
 
 
-@app.get("/api/{league_id}/stats", tags=["api"])
-async def stats(session: SessionDep, league_id: int) -> api.WeekStats:
-    return api.build_stats_response(session, league_id, 0)
+@app.get("/api/{league_id}/stats", tags=["api"], response_model=api.WeekStats)
+def stats(request: Request, session: SessionDep, league_id: int) -> Response:
+    return cache.cached_response(request, session, league_id, ("stats", 0), lambda: api.build_stats_response(session, league_id, 0), archived(league_id))
 
 
 # React App
-@app.get("/{full_path:path}", include_in_schema=False)
-async def serve_react_app(full_path: str):
-    file_path = react_app_path / full_path
-    if file_path.exists() and file_path.is_file():
-        return FileResponse(file_path)
-    else:
-        return FileResponse(react_app_path / "index.html")
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_react_app(request: Request, full_path: str):
+    return react_app.response(request, full_path)
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from pathlib import Path
+from sqlalchemy import CursorResult
+from sqlmodel import Session, col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Any, Awaitable, Callable, cast
+import hashlib
+import os
+import threading
+
+import server.db as db
+import server.serialization as serialization
+
+
+class ResponseCache:
+    """Thread safe LRU of serialized responses."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[tuple, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> bytes | None:
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+            return content
+
+    def set(self, key: tuple, content: bytes):
+        with self.lock:
+            self.entries[key] = content
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def evict_league(self, league_id: int):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == league_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+responses = ResponseCache(int(os.environ.get("PARITY_CACHE_SIZE", 256)))
+
+# seconds browsers and proxies can reuse responses for past leagues before revalidating
+ARCHIVED_MAX_AGE = int(os.environ.get("PARITY_ARCHIVED_MAX_AGE", 60 * 60))
+
+
+def source_version() -> str:
+    """A short hash of the server's source code."""
+    digest = hashlib.sha1()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:10]
+
+
+# part of every ETag so a deploy that changes how responses are built
+# doesn't keep revalidating browsers' copies from the previous build
+BUILD_VERSION = os.environ.get("PARITY_BUILD_VERSION") or source_version()
+
+
+def league_version_statement(league_id: int):
+    """The league's version, or no row if the league doesn't exist."""
+    return (
+        select(db.LeagueVersion.version)
+        .select_from(db.League)
+        .outerjoin(db.LeagueVersion, col(db.LeagueVersion.league_id) == db.League.id)
+        .where(db.League.id == league_id)
+    )
+
+
+def league_version(session: Session, league_id: int) -> tuple[int, bool]:
+    """The league's version and whether the league exists."""
+    rows = session.exec(league_version_statement(league_id)).all()
+    return (rows[0] or 0, True) if rows else (0, False)
+
+
+async def async_league_version(session: AsyncSession, league_id: int) -> tuple[int, bool]:
+    rows = (await session.exec(league_version_statement(league_id))).all()
+    return (rows[0] or 0, True) if rows else (0, False)
+
+
+def bump_version(session: Session, league_id: int):
+    """Invalidate cached responses for a league in every worker.
+
+    Call this after the data has been written (or in the same transaction)
+    so a response built from old data is never cached under the new version.
+    """
+    statement = update(db.LeagueVersion).where(col(db.LeagueVersion.league_id) == league_id).values(version=col(db.LeagueVersion.version) + 1)
+    result = cast(CursorResult, session.execute(statement))
+    if result.rowcount == 0:
+        session.add(db.LeagueVersion(league_id=league_id, version=1))
+
+    responses.evict_league(league_id)
+
+
+def etag(cache_key: tuple) -> str:
+    """A strong ETag that changes whenever the league's version, the build or the serializer does."""
+    return '"' + "-".join([BUILD_VERSION, serialization.json_backend(), *(str(part) for part in cache_key)]) + '"'
+
+
+def etag_matches(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or tag in tags
+
+
+def cache_headers(cache_key: tuple, archived: bool) -> dict[str, str]:
+    """Past leagues are only changed by admin edits so browsers and Caddy can
+    keep them for a while and then revalidate with the ETag. Current league
+    responses are revalidated each time.
+    """
+    if archived:
+        cache_control = f"public, max-age={ARCHIVED_MAX_AGE}"
+    else:
+        cache_control = "no-cache"
+
+    return {"ETag": etag(cache_key), "Cache-Control": cache_control}
+
+
+def cached_response(request: Request, session: Session, league_id: int, key: tuple, build: Callable[[], Any], archived: bool = False) -> Response:
+    """Return the serialized result of build, reusing it until the league's version changes."""
+    version, exists = league_version(session, league_id)
+    cache_key = (league_id, version, *key)
+    headers = cache_headers(cache_key, archived and exists)
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    content = responses.get(cache_key)
+    if content is None:
+        content = serialization.dumps(build())
+        responses.set(cache_key, content)
+
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+async def async_cached_response(
+    request: Request, session: AsyncSession, league_id: int, key: tuple, build: Callable[[], Awaitable[Any]], archived: bool = False
+) -> Response:
+    """cached_response for routes using an async session."""
+    version, exists = await async_league_version(session, league_id)
+    cache_key = (league_id, version, *key)
+    headers = cache_headers(cache_key, archived and exists)
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    content = responses.get(cache_key)
+    if content is None:
+        content = serialization.dumps(await build())
+        responses.set(cache_key, content)
+
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -0,0 +1,237 @@
+from dataclasses import dataclass
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Iterable, Optional, Protocol
+import os
+import re
+import zlib
+
+# brotli is a dependency (gzip is used if it is ever missing), zstandard is optional
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml", "text/")
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes:
+        """Everything compressed so far, without ending the stream."""
+        ...
+
+    def finish(self) -> bytes: ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+@dataclass(frozen=True)
+class CompressionConfig:
+    """How responses are compressed, in order of preference."""
+
+    minimum_size: int = 1024
+    encodings: tuple[str, ...] = ("zstd", "br", "gzip")
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    zstd_level: int = 3
+
+    def compressor(self, encoding: str) -> Compressor:
+        if encoding == "zstd":
+            return ZstdCompressor(self.zstd_level)
+        elif encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        else:
+            return GzipCompressor(self.gzip_level)
+
+
+def available_encodings() -> list[str]:
+    encodings = ["gzip"]
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def config_from_env() -> CompressionConfig:
+    return CompressionConfig(minimum_size=int(os.environ.get("PARITY_COMPRESSION_MIN_SIZE", 1024)))
+
+
+def negotiate(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """Pick the first of encodings the client accepts."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+
+    return None
+
+
+class CompressionMiddleware:
+    """Compress responses with the best encoding the client accepts.
+
+    routes maps path regexes to their own config, the first match wins
+    and a config of None leaves those responses alone. Responses that
+    are already encoded or smaller than minimum_size are sent as is.
+    Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp, config: CompressionConfig = CompressionConfig(), routes: Optional[dict[str, Optional[CompressionConfig]]] = None):
+        self.app = app
+        self.config = config
+        self.routes = [(re.compile(pattern), route_config) for pattern, route_config in (routes or {}).items()]
+        self.encodings = available_encodings()
+
+    def config_for(self, path: str) -> Optional[CompressionConfig]:
+        for pattern, config in self.routes:
+            if pattern.match(path):
+                return config
+        return self.config
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        config = self.config_for(scope["path"]) if scope["type"] == "http" else None
+        if config is None:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate(accept_encoding, [e for e in config.encodings if e in self.encodings])
+
+        responder = CompressionResponder(send, encoding, config)
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """Compresses one response, or only adds Vary when encoding is None."""
+
+    def __init__(self, send: Send, encoding: Optional[str], config: CompressionConfig):
+        self.next = send
+        self.encoding = encoding
+        self.config = config
+
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # wait for the first chunk of the body to decide
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.next(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            assert self.start is not None
+            headers = MutableHeaders(raw=self.start["headers"])
+
+            if self.encoding is None or not self.should_compress(headers, self.start["status"], body, more_body):
+                # caches must not serve this to clients that accept a different encoding
+                if self.varies(headers, self.start["status"]):
+                    headers.add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self.next(self.start)
+                await self.next(message)
+                return
+
+            self.compressor = self.config.compressor(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            # the compressed body isn't byte for byte the same
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                headers["ETag"] = "W/" + headers["etag"]
+
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.next(self.start)
+                await self.next({"type": "http.response.body", "body": body})
+                return
+
+            del headers["Content-Length"]
+            await self.next(self.start)
+
+        if more_body:
+            data = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            data = self.compressor.compress(body) + self.compressor.finish()
+
+        await self.next({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def varies(self, headers: MutableHeaders, status: int) -> bool:
+        """Responses that could have been compressed for another client."""
+        if "content-encoding" in headers or "accept-encoding" in headers.get("vary", "").lower():
+            return False
+        return status == 304 or headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    def should_compress(self, headers: MutableHeaders, status: int, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers or status in (204, 206, 304):
+            return False
+
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+
+        return more_body or len(body) >= self.config.minimum_size
@@ -1,12 +1,34 @@
 from datetime import datetime
 from pathlib import Path
 from pydantic import computed_field
-from sqlmodel import JSON, Column, Field, Relationship, Session, SQLModel, create_engine
-from typing import Optional
+from sqlalchemy import Engine, event, make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import InstrumentedAttribute, defer
+from sqlmodel import JSON, Column, Field, Relationship, Session, SQLModel, col, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional, cast
+import logging
 import os
+import threading
 
+from server.points import PointsType
 
-def get_session():
+logger = logging.getLogger(__name__)
+
+_engines: dict[str, Engine] = {}
+_async_engines: dict[str, AsyncEngine] = {}
+_engines_lock = threading.Lock()
+
+# async drivers for each database backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def database_url() -> str:
     db_path = Path(__file__).parent / "db.sqlite"
     db_uri = "sqlite:////" + str(db_path.absolute())
 
@@ -16,12 +38,186 @@ def get_session():
     if "DATABASE_URL" in os.environ:
         db_uri = os.environ["DATABASE_URL"]
 
-    engine = create_engine(db_uri)
+    return db_uri
+
+
+def async_database_url(db_uri: str) -> str:
+    """The same database as db_uri but using an async driver."""
+    url = make_url(db_uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend} databases")
+
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def engine_options(db_uri: str) -> dict:
+    """Pool settings for an engine, configurable through the environment.
+
+    In memory SQLite databases use a single connection pool which
+    doesn't accept sizing options.
+    """
+    options: dict = {
+        "pool_recycle": int(os.environ.get("PARITY_DB_POOL_RECYCLE", 3600)),
+        "pool_pre_ping": os.environ.get("PARITY_DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+
+    if make_url(db_uri).database not in (None, "", ":memory:"):
+        options["pool_size"] = int(os.environ.get("PARITY_DB_POOL_SIZE", 5))
+        options["max_overflow"] = int(os.environ.get("PARITY_DB_MAX_OVERFLOW", 10))
+
+    return options
+
+
+SQLITE_PROFILES: dict[str, dict[str, str | int]] = {
+    # journal_mode is stored in the database file so it has to be switched back explicitly
+    "default": {"journal_mode": "DELETE"},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative values are KiB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def sqlite_pragmas() -> dict[str, str | int]:
+    """The SQLite tuning profile to apply to every new connection.
+
+    PARITY_SQLITE_PROFILE picks the profile and PARITY_SQLITE_PRAGMAS can
+    override individual values e.g. "mmap_size=0,busy_timeout=10000".
+    """
+    profile = os.environ.get("PARITY_SQLITE_PROFILE", "wal")
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown PARITY_SQLITE_PROFILE: {profile}")
+
+    pragmas = dict(SQLITE_PROFILES[profile])
+
+    overrides = os.environ.get("PARITY_SQLITE_PRAGMAS", "")
+    for override in filter(None, overrides.split(",")):
+        name, value = override.split("=")
+        pragmas[name.strip()] = value.strip()
+
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict[str, str | int]):
+    logged = False
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        nonlocal logged
+
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+        if not logged:
+            effective = {}
+            for name in pragmas:
+                cursor.execute(f"PRAGMA {name}")
+                effective[name] = cursor.fetchone()[0]
+            logger.info("SQLite pragmas for %s: %s", engine.url, effective)
+            logged = True
+
+        cursor.close()
+
+
+def get_engine(db_uri: Optional[str] = None) -> Engine:
+    """Return the process wide engine for db_uri, creating it on first use."""
+    db_uri = db_uri or database_url()
+
+    with _engines_lock:
+        if db_uri not in _engines:
+            engine = create_engine(db_uri, **engine_options(db_uri))
+            if engine.dialect.name == "sqlite":
+                apply_sqlite_pragmas(engine, sqlite_pragmas())
+            _engines[db_uri] = engine
+        return _engines[db_uri]
+
+
+def set_engine(engine: Engine, db_uri: Optional[str] = None):
+    """Swap the engine used for db_uri. Tests use this to inject their database."""
+    db_uri = db_uri or database_url()
+
+    with _engines_lock:
+        previous = _engines.get(db_uri)
+        _engines[db_uri] = engine
+
+    if previous and previous is not engine:
+        previous.dispose()
+
+
+def get_async_engine(db_uri: Optional[str] = None) -> AsyncEngine:
+    """The async counterpart of get_engine, configured the same way."""
+    db_uri = db_uri or database_url()
+
+    with _engines_lock:
+        if db_uri not in _async_engines:
+            engine = create_async_engine(async_database_url(db_uri), **engine_options(db_uri))
+            if engine.dialect.name == "sqlite":
+                apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas())
+            _async_engines[db_uri] = engine
+        return _async_engines[db_uri]
+
+
+def set_async_engine(engine: AsyncEngine, db_uri: Optional[str] = None):
+    db_uri = db_uri or database_url()
+
+    with _engines_lock:
+        _async_engines[db_uri] = engine
+
+
+def dispose_engines():
+    with _engines_lock:
+        engines = list(_engines.values())
+        async_engines = list(_async_engines.values())
+        _engines.clear()
+        _async_engines.clear()
+
+    for engine in engines:
+        engine.dispose()
+
+    # closing async connections needs an event loop (see dispose_async_engines)
+    for async_engine in async_engines:
+        async_engine.sync_engine.dispose(close=False)
+
+
+async def dispose_async_engines():
+    with _engines_lock:
+        async_engines = list(_async_engines.values())
+        _async_engines.clear()
+
+    for engine in async_engines:
+        await engine.dispose()
+
+
+def get_session():
+    with Session(get_engine()) as session:
+        yield session
+
 
-    with Session(engine) as session:
+async def get_async_session():
+    async with AsyncSession(get_async_engine()) as session:
         yield session
 
 
+def create_tables(engine: Optional[Engine] = None):
+    """Create any tables missing from the database. Existing tables are left alone.
+
+    Called when the app starts and by the command line tools so a database
+    from an older version gets the tables added since.
+    """
+    engine = engine or get_engine()
+    try:
+        SQLModel.metadata.create_all(engine)
+    except OperationalError:
+        # another worker created the same table first
+        SQLModel.metadata.create_all(engine)
+
+
 class League(SQLModel, table=True):
     """Represents a league in the database."""
 
@@ -39,6 +235,28 @@ class League(SQLModel, table=True):
     matchups: list["Matchup"] = Relationship(back_populates="league")
 
 
+class LeagueVersion(SQLModel, table=True):
+    """Generation counter bumped whenever a league's data changes.
+
+    Stored in the database so every worker sees the same value.
+    """
+
+    league_id: int = Field(foreign_key="league.id", primary_key=True)
+    version: int = Field(default=0)
+
+
+class ZuluruPage(SQLModel, table=True):
+    """The last version of a Zuluru page seen by the sync.
+
+    Used for conditional requests so unchanged pages aren't parsed again.
+    """
+
+    url: str = Field(primary_key=True)
+    etag: Optional[str] = Field(default=None)
+    last_modified: Optional[str] = Field(default=None)
+    content_hash: str = Field()
+
+
 class Player(SQLModel, table=True):
     """Represents a player in the database."""
 
@@ -137,7 +355,7 @@ class Game(SQLModel, table=True):
 
     home_roster: list[str] = Field(default=None, sa_column=Column(JSON))
     away_roster: list[str] = Field(default=None, sa_column=Column(JSON))
-    points: list = Field(default=None, sa_column=Column(JSON))
+    points: list = Field(default=None, sa_column=Column(PointsType()))
 
     home_score: int = Field(default=None)
     away_score: int = Field(default=None)
@@ -146,6 +364,27 @@ class Game(SQLModel, table=True):
     stats: list["Stats"] = Relationship(back_populates="game")
 
 
+# every column except the (large) points JSON
+GAME_SUMMARY_COLUMNS = [
+    col(Game.id),
+    col(Game.league_id),
+    col(Game.week),
+    col(Game.home_team),
+    col(Game.away_team),
+    col(Game.home_roster),
+    col(Game.away_roster),
+    col(Game.home_score),
+    col(Game.away_score),
+]
+
+GAME_COLUMNS = [*GAME_SUMMARY_COLUMNS, col(Game.points)]
+
+
+def without_points():
+    """Query option deferring Game.points until it is accessed."""
+    return defer(cast(InstrumentedAttribute, Game.points))
+
+
 STAT_VALUES = {
     "v2": {
         "goals": 10000,
@@ -204,10 +443,6 @@ class Stats(SQLModel, table=True):
     game: "Game" = Relationship(back_populates="stats")
     player: "Player" = Relationship(back_populates="stats")
 
-    def count_stat(self, stat):
-        value = getattr(self, stat)
-        setattr(self, stat, value + 1)
-
     # computed_field has a known issue with mypy
     # https://docs.pydantic.dev/2.0/usage/computed_fields/
 
@@ -265,3 +500,65 @@ class Stats(SQLModel, table=True):
             return 0
         else:
             return (self.o_points_for + self.d_points_for) / self.points_played
+
+
+class StatTotals(SQLModel):
+    """Stats summed over every game a player has played in.
+
+    pay, salary_per_point and the efficiencies are summed per game
+    so they can be averaged over games_played when read.
+    """
+
+    goals: int = Field(default=0)
+    assists: int = Field(default=0)
+    second_assists: int = Field(default=0)
+    d_blocks: int = Field(default=0)
+    completions: int = Field(default=0)
+    throw_aways: int = Field(default=0)
+    threw_drops: int = Field(default=0)
+    catches: int = Field(default=0)
+    drops: int = Field(default=0)
+    pulls: int = Field(default=0)
+    callahan: int = Field(default=0)
+    o_points_for: int = Field(default=0)
+    o_points_against: int = Field(default=0)
+    d_points_for: int = Field(default=0)
+    d_points_against: int = Field(default=0)
+
+    games_played: int = Field(default=0)
+    pay: int = Field(default=0)
+    salary_per_point: int = Field(default=0)
+    o_efficiency: float = Field(default=0)
+    d_efficiency: float = Field(default=0)
+    total_efficiency: float = Field(default=0)
+
+    # team from the most recent game (by week then id)
+    team: str = Field(default="Unknown")
+    last_game_week: Optional[int] = Field(default=None)
+    last_game_id: Optional[int] = Field(default=None)
+
+
+class PlayerSeasonStats(StatTotals, table=True):
+    """Materialized season totals for a player. Maintained by server.aggregates"""
+
+    id: int = Field(default=None, primary_key=True)
+    league_id: int = Field(foreign_key="league.id", index=True)
+    player_id: int = Field(foreign_key="player.id", index=True)
+
+
+class PlayerWeekStats(StatTotals, table=True):
+    """Materialized weekly totals for a player. Maintained by server.aggregates"""
+
+    id: int = Field(default=None, primary_key=True)
+    league_id: int = Field(foreign_key="league.id", index=True)
+    week: int = Field(index=True)
+    player_id: int = Field(foreign_key="player.id", index=True)
+
+
+class LeagueTotals(SQLModel, table=True):
+    """Marks a league whose PlayerSeasonStats and PlayerWeekStats have been built.
+
+    Leagues without a row are summed from their Stats until the totals are built.
+    """
+
+    league_id: int = Field(foreign_key="league.id", primary_key=True)
@@ -0,0 +1,43 @@
+from sqlalchemy import func, update
+from sqlmodel import Session, col, select
+
+import server.db as db
+
+BATCH_SIZE = 100
+
+
+def stored_size(session: Session) -> int:
+    """Bytes used by the stored points of every game."""
+    return session.exec(select(func.coalesce(func.sum(func.length(col(db.Game.points))), 0))).one()
+
+
+def migrate(session: Session) -> int:
+    """Rewrite the points of every game with the configured PARITY_POINTS_CODEC.
+
+    Reading decodes either format, so this converts JSON rows to binary or,
+    with PARITY_POINTS_CODEC=json, binary rows back to JSON.
+    """
+    game_ids = session.exec(select(db.Game.id).order_by(col(db.Game.id))).all()
+
+    for start in range(0, len(game_ids), BATCH_SIZE):
+        batch = game_ids[start : start + BATCH_SIZE]
+        rows = session.exec(select(db.Game.id, db.Game.points).where(col(db.Game.id).in_(batch))).all()
+        session.execute(update(db.Game), [{"id": game_id, "points": points} for game_id, points in rows])
+        session.commit()
+
+    return len(game_ids)
+
+
+if __name__ == "__main__":
+    engine = db.get_engine()
+
+    with Session(engine) as session:
+        before = stored_size(session)
+        count = migrate(session)
+        after = stored_size(session)
+        print(f"Rewrote points for {count} games: {before / 1024:.0f} KiB -> {after / 1024:.0f} KiB")
+
+    # SQLite only returns the freed pages to the filesystem on VACUUM
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
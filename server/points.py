@@ -0,0 +1,259 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+from typing import Any, Callable, Optional
+import json
+import os
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+# Binary points start with MAGIC and a compression byte. Anything else is JSON.
+MAGIC = b"PTS\x01"
+COMPRESSIONS = ["none", "zlib", "zstd"]
+ZSTD_LEVEL = 3
+
+# ts_format, first timestamp, strings length, number of points, number of lineup entries
+HEADER = struct.Struct("<Bqiii")
+# offense size, defense size, number of events
+POINT = struct.Struct("<BBH")
+# type, firstActor, secondActor + 1 (0 is None), timestamp delta (or string index)
+EVENT = struct.Struct("<HHHi")
+
+EPOCH = datetime(1970, 1, 1)
+MAX_INDEX = 0xFFFF
+
+
+@lru_cache(maxsize=64)
+def java_date(days: int) -> str:
+    dt = EPOCH + timedelta(days=days)
+    return f"{dt:%b} {dt.day}, {dt.year}"
+
+
+def java_timestamp(units: int) -> str:
+    days, seconds = divmod(units, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{java_date(days)} {hours % 12 or 12}:{minutes:02}:{seconds:02} {'AM' if hours < 12 else 'PM'}"
+
+
+def parse_java_timestamp(timestamp: str) -> int:
+    return int((datetime.strptime(timestamp, "%b %d, %Y %I:%M:%S %p") - EPOCH).total_seconds())
+
+
+@lru_cache(maxsize=64)
+def iso_date(days: int) -> str:
+    return f"{EPOCH + timedelta(days=days):%Y-%m-%d}"
+
+
+def iso_timestamp(units: int) -> str:
+    days, milliseconds = divmod(units, 86400000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{iso_date(days)}T{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}Z"
+
+
+def parse_iso_timestamp(timestamp: str) -> int:
+    return (datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ") - EPOCH) // timedelta(milliseconds=1)
+
+
+# Timestamp formats stored as integer deltas, indexed by the ts_format byte.
+# Format 0 keeps the timestamps as strings in the dictionary.
+# "Oct 26, 2017 8:51:17 PM" from the android app and toISOString() from the web stat keeper.
+TIMESTAMP_FORMATS: list[tuple[Callable[[str], int], Callable[[int], str]]] = [
+    (parse_java_timestamp, java_timestamp),
+    (parse_iso_timestamp, iso_timestamp),
+]
+
+
+def points_codec() -> str:
+    """PARITY_POINTS_CODEC is how Game.points are written, binary (the default) or json.
+
+    Both are always readable so the codec can be switched at any time.
+    """
+    codec = os.environ.get("PARITY_POINTS_CODEC", "binary")
+    if codec not in ["binary", "json"]:
+        raise ValueError(f"Unknown PARITY_POINTS_CODEC: {codec}")
+    return codec
+
+
+def points_compression() -> str:
+    """PARITY_POINTS_COMPRESSION for binary points, zstd (if installed), zlib or none."""
+    default = "zstd" if zstandard is not None else "zlib"
+    compression = os.environ.get("PARITY_POINTS_COMPRESSION", default)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown PARITY_POINTS_COMPRESSION: {compression}")
+    if compression == "zstd" and zstandard is None:
+        return "zlib"
+    return compression
+
+
+def timestamp_units(timestamps: list[str]) -> tuple[int, list[int]]:
+    """The first format every timestamp round trips through, as integer units."""
+    for ts_format, (parse, format) in enumerate(TIMESTAMP_FORMATS, start=1):
+        try:
+            units = [parse(timestamp) for timestamp in timestamps]
+        except ValueError:
+            continue
+        if all(format(u) == timestamp for u, timestamp in zip(units, timestamps)):
+            return ts_format, units
+    return 0, []
+
+
+def pack(points: list[dict]) -> bytes:
+    """Pack points into a player dictionary and fixed size event records."""
+    strings: dict[str, int] = {}
+
+    def index(value: str) -> int:
+        return strings.setdefault(value, len(strings))
+
+    timestamps = [event["timestamp"] for point in points for event in point["events"]]
+    ts_format, units = timestamp_units(timestamps)
+    base = units[0] if units else 0
+
+    point_records: list[bytes] = []
+    lineups: list[int] = []
+    events: list[tuple[int, int, int, int]] = []
+    previous = base
+    for point in points:
+        point_records.append(POINT.pack(len(point["offensePlayers"]), len(point["defensePlayers"]), len(point["events"])))
+        lineups += [index(name) for name in point["offensePlayers"] + point["defensePlayers"]]
+        for event in point["events"]:
+            if ts_format:
+                timestamp = units[len(events)] - previous
+                previous = units[len(events)]
+            else:
+                timestamp = index(event["timestamp"])
+            second = event["secondActor"]
+            events.append((index(event["type"]), index(event["firstActor"]), 0 if second is None else index(second) + 1, timestamp))
+
+    if len(strings) >= MAX_INDEX:
+        raise ValueError("Too many distinct strings to pack")
+
+    blob = "\0".join(strings).encode()
+    return b"".join(
+        [
+            HEADER.pack(ts_format, base, len(blob), len(points), len(lineups)),
+            blob,
+            *point_records,
+            struct.pack(f"<{len(lineups)}H", *lineups),
+            *[EVENT.pack(*e) for e in events],
+        ]
+    )
+
+
+def unpack(data: bytes) -> list[dict]:
+    ts_format, first_timestamp, blob_size, point_count, lineup_count = HEADER.unpack_from(data)
+    offset = HEADER.size
+
+    strings = data[offset : offset + blob_size].decode().split("\0")
+    offset += blob_size
+
+    point_records = list(POINT.iter_unpack(data[offset : offset + point_count * POINT.size]))
+    offset += point_count * POINT.size
+
+    lineups = [strings[i] for i in struct.unpack_from(f"<{lineup_count}H", data, offset)]
+    offset += lineup_count * 2
+
+    records = list(EVENT.iter_unpack(data[offset:]))
+    if ts_format:
+        format = TIMESTAMP_FORMATS[ts_format - 1][1]
+        timestamps = [format(units) for units in accumulate([r[3] for r in records], initial=first_timestamp)][1:]
+    else:
+        timestamps = [strings[r[3]] for r in records]
+
+    seconds = [None, *strings]
+    events = [
+        {"timestamp": timestamp, "type": strings[type], "firstActor": strings[first], "secondActor": seconds[second]}
+        for (type, first, second, _), timestamp in zip(records, timestamps)
+    ]
+
+    points = []
+    player = event = 0
+    for offense, defense, event_count in point_records:
+        points.append(
+            {
+                "defensePlayers": lineups[player + offense : player + offense + defense],
+                "offensePlayers": lineups[player : player + offense],
+                "events": events[event : event + event_count],
+            }
+        )
+        player += offense + defense
+        event += event_count
+
+    return points
+
+
+def encode(points: Optional[list], codec: str = "", compression: str = "") -> Optional[bytes]:
+    """Points as stored in the database.
+
+    Points that the binary format can't reproduce exactly (such as games
+    stored before uploads were validated) fall back to JSON.
+    """
+    if points is None:
+        return None
+
+    if (codec or points_codec()) == "binary":
+        try:
+            packed = pack(points)
+        except (KeyError, TypeError, ValueError, struct.error):
+            packed = None
+
+        if packed is not None and unpack(packed) == points:
+            compression = compression or points_compression()
+            return MAGIC + bytes([COMPRESSIONS.index(compression)]) + compress(packed, compression)
+
+    return json.dumps(points).encode()
+
+
+def decode(data: Optional[bytes | str]) -> Optional[list]:
+    if data is None:
+        return None
+
+    if isinstance(data, bytes) and data.startswith(MAGIC):
+        compression = COMPRESSIONS[data[len(MAGIC)]]
+        return unpack(decompress(data[len(MAGIC) + 1 :], compression))
+
+    return json.loads(data)
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if compression == "zlib":
+        return zlib.compress(data)
+    return data
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Points are zstd compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+class PointsType(TypeDecorator):
+    """Game.points, stored with the configured codec and decoded transparently.
+
+    Rows written as JSON (including those from before this type existed)
+    are still read so the codec can be changed without a migration.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect) -> Optional[bytes]:
+        return encode(value)
+
+    def process_result_value(self, value: Any, dialect) -> Optional[list]:
+        return decode(value)
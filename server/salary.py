@@ -0,0 +1,85 @@
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+import sqlalchemy
+
+from server.aggregates import round_div, stats_pay, stats_points_played
+import server.db as db
+
+BASE_SALARY = 500000
+PRO_RATED_NUMBER_OF_POINTS = 15
+
+# games with this many points or fewer don't count towards a pro rated salary
+MIN_POINTS_PLAYED = 3
+
+
+def salary_totals_statement(league_id: int) -> sqlalchemy.Select:
+    """Sum what each salary calculation needs per player in one GROUP BY query."""
+    pay = stats_pay()
+    points_played = stats_points_played()
+    counted = points_played > MIN_POINTS_PLAYED
+
+    return (
+        sqlalchemy.select(
+            col(db.Stats.player_id),
+            func.sum(pay).label("pay"),
+            func.sum(sqlalchemy.case((counted, round_div(pay, points_played)), else_=0)).label("salary_per_point"),
+            func.sum(sqlalchemy.case((counted, 1), else_=0)).label("counted_games"),
+        )
+        .where(col(db.Stats.league_id) == league_id)
+        .group_by(col(db.Stats.player_id))
+    )
+
+
+def calculate_salaries(session: Session, league: db.League) -> dict[int, int]:
+    """Salaries for players with stats, keyed on player id."""
+    salaries = {}
+
+    for player_id, pay, salary_per_point, counted_games in session.execute(salary_totals_statement(league.id)).all():
+        if league.salary_calc == "pro_rate":
+            if counted_games == 0:
+                continue
+            average_salary_per_point = salary_per_point / counted_games
+            salaries[player_id] = round(average_salary_per_point * PRO_RATED_NUMBER_OF_POINTS)
+
+        elif league.salary_calc == "sum":
+            salaries[player_id] = BASE_SALARY + pay
+
+    return salaries
+
+
+def player_salaries(session: Session, league_id: int) -> list[tuple[db.Player, str, int]]:
+    """Every rostered player with their team name and salary.
+
+    Players without a calculated salary fall back to their own
+    fallback salary or the average salary for their gender.
+    """
+    league = session.get(db.League, league_id)
+    if league is None:
+        return []
+
+    salaries = calculate_salaries(session, league)
+
+    statement = select(db.Player, db.Team.name).join(db.Team).where(db.Player.league_id == league_id).order_by(col(db.Player.id).asc())
+    players = session.exec(statement).all()
+
+    # Estimate Salaries 👎
+    male_salaries = [salaries[p.id] for p, _ in players if p.is_open and salaries.get(p.id)]
+    female_salaries = [salaries[p.id] for p, _ in players if not p.is_open and salaries.get(p.id)]
+
+    avg_male_salary = round(sum(male_salaries) / (len(male_salaries) or 1))
+    avg_female_salary = round(sum(female_salaries) / (len(female_salaries) or 1))
+
+    results = []
+    for player, team_name in players:
+        salary = salaries.get(player.id)
+        if salary is None:
+            if player.fallback_salary:
+                salary = round(player.fallback_salary)
+            elif player.is_open:
+                salary = avg_male_salary
+            else:
+                salary = avg_female_salary
+
+        results.append((player, team_name, salary))
+
+    return results
@@ -0,0 +1,48 @@
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.responses import Response
+from typing import Any
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+BACKENDS = ["pydantic", "orjson"]
+
+
+def json_backend() -> str:
+    """PARITY_JSON_BACKEND picks how response bodies are serialized.
+
+    pydantic (the default) is fastest for models. orjson is faster for
+    plain dicts and lists and comes with the `fast` extra. Without it
+    the orjson backend falls back to pydantic.
+    """
+    backend = os.environ.get("PARITY_JSON_BACKEND", "pydantic")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PARITY_JSON_BACKEND: {backend}")
+
+    if backend == "orjson" and orjson is None:
+        return "pydantic"
+
+    return backend
+
+
+def dump_model(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any, backend: str = "") -> bytes:
+    """Serialize content to JSON using the field aliases of any models in it."""
+    if (backend or json_backend()) == "orjson" and orjson is not None:
+        return orjson.dumps(content, default=dump_model, option=orjson.OPT_NON_STR_KEYS)
+
+    return to_json(content, by_alias=True)
+
+
+def json_response(content: Any) -> Response:
+    """A response for content that doesn't need FastAPI to validate it again."""
+    return Response(content=dumps(content), media_type="application/json")
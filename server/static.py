@@ -0,0 +1,126 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from typing import Optional
+import gzip
+import hashlib
+import mimetypes
+import sys
+
+from server.cache import etag_matches
+from server.compression import negotiate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# vite fingerprints everything in assets/ so it can be cached forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+NO_CACHE = "no-cache"
+
+COMPRESSIBLE = {".css", ".html", ".js", ".json", ".map", ".svg", ".txt", ".webmanifest", ".xml"}
+MIN_COMPRESS_SIZE = 1024
+
+# preferred order when a client accepts several
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass
+class Asset:
+    path: Path
+    media_type: str
+    cache_control: str
+    etag: str
+    variants: dict[str, Path] = field(default_factory=dict)
+
+
+class StaticIndex:
+    """The files in the React build, indexed once at startup.
+
+    Only indexed paths are served so request paths are never joined onto
+    the filesystem. Unknown paths get index.html for client side routing.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: dict[str, Asset] = {}
+
+        if root.is_dir():
+            for path in sorted(root.rglob("*")):
+                if path.is_file() and path.suffix not in ENCODINGS.values():
+                    self.assets[path.relative_to(root).as_posix()] = self.index_file(path)
+
+    def index_file(self, path: Path) -> Asset:
+        stat = path.stat()
+        name = path.relative_to(self.root).as_posix()
+
+        variants = {}
+        for encoding, suffix in ENCODINGS.items():
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file() and variant.stat().st_mtime >= stat.st_mtime:
+                variants[encoding] = variant
+
+        return Asset(
+            path=path,
+            media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            cache_control=IMMUTABLE if name.startswith("assets/") else NO_CACHE,
+            etag='"' + hashlib.md5(f"{name}-{stat.st_mtime}-{stat.st_size}".encode()).hexdigest() + '"',
+            variants=variants,
+        )
+
+    def lookup(self, full_path: str) -> Optional[Asset]:
+        return self.assets.get(full_path.strip("/")) or self.assets.get("index.html")
+
+    def response(self, request: Request, full_path: str) -> Response:
+        asset = self.lookup(full_path)
+        if asset is None:
+            return Response("Not Found", status_code=404)
+
+        encoding = negotiate(request.headers.get("accept-encoding", ""), [e for e in ENCODINGS if e in asset.variants])
+        etag = asset.etag if encoding is None else asset.etag[:-1] + f'-{encoding}"'
+
+        headers = {"Cache-Control": asset.cache_control, "ETag": etag}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        # the middleware weakens the etag of files it compresses itself
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding is None:
+            return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+        headers["Content-Encoding"] = encoding
+        return FileResponse(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+
+
+def precompress(root: Path) -> int:
+    """Write .gz and .br copies next to compressible files.
+
+    Run after `yarn build` so the server doesn't compress on each request.
+    """
+    compressors = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+
+    written = 0
+    for path in sorted(root.rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE or path.stat().st_size < MIN_COMPRESS_SIZE:
+            continue
+
+        data = path.read_bytes()
+        for suffix, compress in compressors.items():
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+                written += 1
+
+    return written
+
+
+if __name__ == "__main__":
+    build_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parents[1] / "web/build"
+    count = precompress(build_dir)
+    print(f"Wrote {count} compressed files in {build_dir}")
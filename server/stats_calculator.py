@@ -1,112 +1,179 @@
-from sqlmodel import Session, select
+from sqlalchemy import insert
+from sqlmodel import Session, col, select
 
+from server.aggregates import COUNTING_STATS
+import server.aggregates as aggregates
 import server.db as db
 
+# indexes into each player's counts (same order as COUNTING_STATS)
+(
+    GOALS,
+    ASSISTS,
+    SECOND_ASSISTS,
+    D_BLOCKS,
+    COMPLETIONS,
+    THROW_AWAYS,
+    THREW_DROPS,
+    CATCHES,
+    DROPS,
+    PULLS,
+    CALLAHAN,
+    O_POINTS_FOR,
+    O_POINTS_AGAINST,
+    D_POINTS_FOR,
+    D_POINTS_AGAINST,
+) = range(len(COUNTING_STATS))
+
 
 class StatsCalculator:
     def __init__(self, game: db.Game):
         self.game = game
 
         league = game.league
+        self.game_id = game.id
         self.league_id = league.id
         self.stat_values = league.stat_values
 
+        self.handlers = {
+            "PASS": self.process_pass,
+            "DROP": self.process_drop,
+            "THROWAWAY": self.process_throw_away,
+            "DEFENSE": self.process_defense,
+            "POINT": self.process_goal,
+            "PULL": self.process_pull,
+        }
+
     def run(self, session: Session):
         self.session = session
-        self.stats: dict[str, db.Stats] = {}
+        self.calculate()
 
-        for point in self.game.points:
-            self.process_point(point)
+        if not self.stats:
+            return
 
-        for name, player_stats in self.stats.items():
-            self.session.add(player_stats)
+        players = self.resolve_players(list(self.stats))
+
+        stats = [
+            db.Stats(
+                league_id=self.league_id,
+                game_id=self.game_id,
+                player_id=players[name],
+                stat_values=self.stat_values,
+                **dict(zip(COUNTING_STATS, counts)),
+            )
+            for name, counts in self.stats.items()
+        ]
+
+        columns = set(db.Stats.model_fields) - {"id"}
+        self.session.execute(insert(db.Stats), [s.model_dump(include=columns) for s in stats])
+
+        aggregates.add_game(self.session, self.game, stats)
 
         self.session.commit()
 
+    def calculate(self) -> dict[str, list[int]]:
+        """Count every player's stats for the game without touching the database."""
+        self.stats: dict[str, list[int]] = {}
+
+        for point in self.game.points:
+            self.process_point(point)
+
+        return self.stats
+
     def process_point(self, point):
         events = point["events"]
-        offensePlayers = point["offensePlayers"]
-        defensePlayers = point["defensePlayers"]
+        if not events:
+            return
+
+        self.offense_players = point["offensePlayers"]
+        self.defense_players = point["defensePlayers"]
+
+        # a pass is only a completion if it isn't dropped
+        self.pending_pass = None
 
-        for idx, event in enumerate(events):
-            self.process_event(idx, event, events, offensePlayers, defensePlayers)
+        # the first events look back around to the end of the point
+        previous = events[-1]
+        previous_previous = events[-2] if len(events) > 1 else None
 
-    def process_event(self, idx, event, events, offensePlayers, defensePlayers):
-        if event["type"] == "PASS":
-            more_events = idx + 1 < len(events)
-            if more_events:
-                next_event = events[idx + 1]
-                if next_event["type"] != "DROP":
-                    self.add_stat(event["firstActor"], "completions")
-                    self.add_stat(event["secondActor"], "catches")
+        for event in events:
+            event_type = event["type"]
 
-        elif event["type"] == "DROP":
-            previous_event = events[idx - 1]
-            self.add_stat(event["firstActor"], "drops")
-            self.add_stat(previous_event["firstActor"], "threw_drops")
+            if self.pending_pass and event_type != "DROP":
+                self.add_stat(self.pending_pass["firstActor"], COMPLETIONS)
+                self.add_stat(self.pending_pass["secondActor"], CATCHES)
+            self.pending_pass = None
 
-        elif event["type"] == "THROWAWAY":
-            self.add_stat(event["firstActor"], "throw_aways")
+            handler = self.handlers.get(event_type)
+            if handler:
+                handler(event, previous, previous_previous)
 
-        elif event["type"] == "DEFENSE":
-            self.add_stat(event["firstActor"], "d_blocks")
+            previous_previous = previous
+            previous = event
 
-        elif event["type"] == "POINT":
-            self.add_stat(event["firstActor"], "goals")
+    def process_pass(self, event, previous, previous_previous):
+        self.pending_pass = event
 
-            # Assist and 2nd Assist
-            previous_previous_event = events[idx - 2]
-            previous_event = events[idx - 1]
+    def process_drop(self, event, previous, previous_previous):
+        self.add_stat(event["firstActor"], DROPS)
+        self.add_stat(previous["firstActor"], THREW_DROPS)
 
-            was_pass = previous_event["type"] == "PASS"
-            was_d = previous_event["type"] == "DEFENSE"
-            was_drop = previous_event["type"] == "DROP"
+    def process_throw_away(self, event, previous, previous_previous):
+        self.add_stat(event["firstActor"], THROW_AWAYS)
 
-            if was_pass and previous_event["secondActor"] == event["firstActor"]:
-                self.add_stat(previous_event["firstActor"], "assists")
+    def process_defense(self, event, previous, previous_previous):
+        self.add_stat(event["firstActor"], D_BLOCKS)
 
-                if previous_previous_event["type"] == "PASS":
-                    prev_actor = previous_previous_event["firstActor"]
-                    self.add_stat(prev_actor, "second_assists")
+    def process_pull(self, event, previous, previous_previous):
+        self.add_stat(event["firstActor"], PULLS)
 
-            # Callahan
-            elif was_d or was_drop:
-                self.add_stat(event["firstActor"], "callahan")
+    def process_goal(self, event, previous, previous_previous):
+        scorer = event["firstActor"]
+        self.add_stat(scorer, GOALS)
 
-            # Finish Point
-            offenseScored = event["firstActor"] in offensePlayers
+        # Assist and 2nd Assist
+        previous_type = previous["type"]
 
-            if offenseScored:
-                [self.add_stat(player, "o_points_for") for player in offensePlayers]
-                [self.add_stat(player, "d_points_against") for player in defensePlayers]
-            else:
-                [self.add_stat(player, "o_points_against") for player in offensePlayers]
-                [self.add_stat(player, "d_points_for") for player in defensePlayers]
+        if previous_type == "PASS" and previous["secondActor"] == scorer:
+            self.add_stat(previous["firstActor"], ASSISTS)
 
-        elif event["type"] == "PULL":
-            self.add_stat(event["firstActor"], "pulls")
+            if previous_previous["type"] == "PASS":
+                self.add_stat(previous_previous["firstActor"], SECOND_ASSISTS)
+
+        # Callahan
+        elif previous_type == "DEFENSE" or previous_type == "DROP":
+            self.add_stat(scorer, CALLAHAN)
+
+        # Finish Point
+        if scorer in self.offense_players:
+            self.add_to_line(self.offense_players, O_POINTS_FOR)
+            self.add_to_line(self.defense_players, D_POINTS_AGAINST)
+        else:
+            self.add_to_line(self.offense_players, O_POINTS_AGAINST)
+            self.add_to_line(self.defense_players, D_POINTS_FOR)
+
+    def add_to_line(self, players, stat):
+        for player in players:
+            self.add_stat(player, stat)
 
     def add_stat(self, player_name, stat):
-        player = self.get_or_create_player(player_name)
+        counts = self.stats.get(player_name)
+        if counts is None:
+            counts = self.stats[player_name] = [0] * len(COUNTING_STATS)
 
-        if player.name not in self.stats:
-            self.stats[player.name] = db.Stats(
-                league_id=self.league_id,
-                game_id=self.game.id,
-                player_id=player.id,
-                stat_values=self.stat_values,
-            )
+        counts[stat] += 1
 
-        self.stats[player.name].count_stat(stat)
+    def resolve_players(self, names: list[str]) -> dict[str, int]:
+        """Map player names to ids in one query, creating any missing players."""
+        statement = (
+            select(db.Player.id, db.Player.name).where(db.Player.league_id == self.league_id, col(db.Player.name).in_(names)).order_by(col(db.Player.id).asc())
+        )
 
-    def get_or_create_player(self, player_name):
-        statement = select(db.Player).where(db.Player.league_id == self.league_id, db.Player.name == player_name)
-        instance = self.session.exec(statement).first()
+        players: dict[str, int] = {}
+        for player_id, name in self.session.exec(statement).all():
+            players.setdefault(name, player_id)
 
-        if instance:
-            return instance
-        else:
-            instance = db.Player(name=player_name, league_id=self.league_id)
-            self.session.add(instance)
-            self.session.commit()
-            return instance
+        missing = [{"name": name, "league_id": self.league_id} for name in names if name not in players]
+        if missing:
+            created = self.session.execute(insert(db.Player).returning(col(db.Player.id), col(db.Player.name)), missing)
+            players.update({name: player_id for player_id, name in created})
+
+        return players
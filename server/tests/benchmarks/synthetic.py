@@ -0,0 +1,107 @@
+from pathlib import Path
+from sqlalchemy import insert
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+import json
+import random
+import re
+
+from server.aggregates import COUNTING_STATS
+import server.db as db
+
+TEAMS_PER_SEASON = 16
+PLAYERS_PER_TEAM = 12
+WEEKS_PER_SEASON = 15
+
+
+def create_league(seasons: int, seed: int = 0) -> Session:
+    """An in memory league with `seasons` worth of games and stats.
+
+    Each season has ~200 players and ~3,000 stats rows which roughly
+    matches a real parity season. Seasons are stacked into one league
+    so the number of players grows along with the number of stats.
+    """
+    rng = random.Random(seed)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+
+    league = db.League(id=1, zuluru_id=1, name="Synthetic")
+    session.add(league)
+    session.commit()
+
+    player_id = 0
+    game_id = 0
+    teams, players, games, stats = [], [], [], []
+
+    for season in range(seasons):
+        rosters = {}
+        for t in range(TEAMS_PER_SEASON):
+            team_id = season * TEAMS_PER_SEASON + t + 1
+            team_name = f"Team {season}-{t}"
+            teams.append({"id": team_id, "league_id": 1, "zuluru_id": team_id, "name": team_name})
+
+            roster = []
+            for p in range(PLAYERS_PER_TEAM):
+                player_id += 1
+                name = f"Player {player_id}"
+                gender = "male" if p < 8 else "female"
+                players.append({"id": player_id, "league_id": 1, "team_id": team_id, "name": name, "gender": gender, "fallback_salary": None})
+                roster.append((player_id, name))
+            rosters[team_name] = roster
+
+        team_names = list(rosters)
+        for week in range(1, WEEKS_PER_SEASON + 1):
+            rng.shuffle(team_names)
+            for home, away in zip(team_names[::2], team_names[1::2]):
+                game_id += 1
+                games.append(
+                    {
+                        "id": game_id,
+                        "league_id": 1,
+                        "week": season * WEEKS_PER_SEASON + week,
+                        "home_team": home,
+                        "away_team": away,
+                        "home_roster": [name for _, name in rosters[home]],
+                        "away_roster": [name for _, name in rosters[away]],
+                        "points": [],
+                        "home_score": rng.randint(5, 15),
+                        "away_score": rng.randint(5, 15),
+                    }
+                )
+                for pid, _ in rosters[home] + rosters[away]:
+                    row = {stat: rng.randint(0, 5) for stat in COUNTING_STATS}
+                    stats.append({"league_id": 1, "game_id": game_id, "player_id": pid, "stat_values": "v2", **row})
+
+    session.execute(insert(db.Team), teams)
+    session.execute(insert(db.Player), players)
+    session.execute(insert(db.Game), games)
+    session.execute(insert(db.Stats), stats)
+    session.commit()
+
+    return session
+
+
+def games_with_points(count: int = 120) -> list[dict]:
+    """A season of games with points as returned by /games?includePoints=true.
+
+    Each game gets its own players and timestamps so the payload doesn't
+    compress unrealistically well.
+    """
+    with open(Path(__file__).parents[1] / "data" / "mini_game.json") as f:
+        game = json.load(f)
+
+    rng = random.Random(0)
+    template = json.dumps(game["points"] * 5)
+    names = sorted(set(game["homeRoster"] + game["awayRoster"]), key=len, reverse=True)
+
+    games = []
+    for game_id in range(count):
+        points = template
+        for name in names:
+            points = points.replace(name, f"Player {rng.randint(1, 200)}")
+        points = re.sub(r"\d{1,2}:\d{2}:\d{2}", lambda m: f"{rng.randint(19, 22)}:{rng.randint(0, 59):02}:{rng.randint(0, 59):02}", points)
+        games.append({**game, "id": game_id, "week": game_id // 8 + 1, "points": json.loads(points)})
+
+    return games
@@ -0,0 +1,42 @@
+from .synthetic import create_league
+from sqlalchemy import func
+from sqlmodel import select
+import pytest
+import time
+
+from server.api import build_stats_response
+import server.aggregates as aggregates
+import server.db as db
+
+
+def time_build_stats_response(seasons, totals):
+    session = create_league(seasons)
+    if totals:
+        aggregates.rebuild(session, 1)
+    assert aggregates.totals_built(session, 1) == totals
+    rows = session.exec(select(func.count()).select_from(db.Stats)).one()
+
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        response = build_stats_response(session, 1, 0)
+        best = min(best, time.perf_counter() - start)
+
+    assert len(response.stats) == seasons * 192
+    session.close()
+    return rows, best
+
+
+@pytest.mark.parametrize("totals", [True, False], ids=["totals", "sum_stats"])
+def test_build_stats_response_scales_linearly(totals):
+    rows_1, time_1 = time_build_stats_response(1, totals)
+    rows_10, time_10 = time_build_stats_response(10, totals)
+
+    per_row_1 = time_1 / rows_1 * 1e6
+    per_row_10 = time_10 / rows_10 * 1e6
+    path = "totals" if totals else "sum_stats"
+    print(f"\n{path}  1 season:  {rows_1} stats rows in {time_1:.3f}s ({per_row_1:.1f}us per row)")
+    print(f"{path} 10 seasons: {rows_10} stats rows in {time_10:.3f}s ({per_row_10:.1f}us per row)")
+
+    # quadratic scaling would be ~100x slower for 10x the data
+    assert time_10 / time_1 < 25
@@ -0,0 +1,66 @@
+from .synthetic import create_league, games_with_points
+from pydantic_core import to_json
+import json
+import time
+
+from server.compression import CompressionConfig, available_encodings
+import server.api as api
+
+SETTINGS = {
+    "gzip": ("gzip_level", [1, 6, 9]),
+    "br": ("brotli_quality", [1, 4, 6, 11]),
+    "zstd": ("zstd_level", [1, 3, 9, 19]),
+}
+
+
+def games_payload() -> bytes:
+    """A season of games with points, like /games?includePoints=true."""
+    return json.dumps(games_with_points()).encode()
+
+
+def stats_payload() -> bytes:
+    """Season stats for a league like /stats."""
+    session = create_league(1)
+    payload = to_json(api.build_stats_response(session, 1, 0), by_alias=True)
+    session.close()
+    return payload
+
+
+def compress(config: CompressionConfig, encoding: str, payload: bytes, chunk_size: int = 0) -> bytes:
+    compressor = config.compressor(encoding)
+    if not chunk_size:
+        return compressor.compress(payload) + compressor.finish()
+
+    chunks = [compressor.compress(payload[i : i + chunk_size]) + compressor.flush() for i in range(0, len(payload), chunk_size)]
+    return b"".join(chunks) + compressor.finish()
+
+
+def measure(config: CompressionConfig, encoding: str, payload: bytes, chunk_size: int = 0) -> tuple[int, float]:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        compressed = compress(config, encoding, payload, chunk_size)
+        best = min(best, time.perf_counter() - start)
+    return len(compressed), best
+
+
+def test_compression():
+    for name, payload in [("games", games_payload()), ("stats", stats_payload())]:
+        print(f"\n{name}: {len(payload) / 1024:.0f} KiB")
+
+        for encoding in available_encodings():
+            setting, levels = SETTINGS[encoding]
+            for level in levels:
+                config = CompressionConfig(**{setting: level})
+                size, seconds = measure(config, encoding, payload)
+                mb_per_second = len(payload) / seconds / 1e6
+                print(
+                    f"{encoding:>5} {setting}={level:<3} {size / 1024:7.1f} KiB ({size / len(payload):.1%})  {seconds * 1000:7.2f}ms  {mb_per_second:6.0f} MB/s"
+                )
+
+                assert size < len(payload) / 3
+
+            # streaming flushes every chunk which costs some ratio
+            config = CompressionConfig()
+            size, seconds = measure(config, encoding, payload, chunk_size=16 * 1024)
+            print(f"{encoding:>5} default streamed  {size / 1024:7.1f} KiB ({size / len(payload):.1%})  {seconds * 1000:7.2f}ms")
@@ -0,0 +1,59 @@
+from .synthetic import games_with_points
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel
+import asyncio
+import time
+import tracemalloc
+
+import server.api as api
+import server.db as db
+import server.serialization as serialization
+
+LEAGUE_ID = 1
+
+
+async def export_list() -> int:
+    with Session(db.get_engine()) as session:
+        return len(serialization.dumps(api.build_games_with_points_response(session, LEAGUE_ID)))
+
+
+async def export_stream() -> int:
+    return sum([len(line) async for line in api.stream_games_export(LEAGUE_ID)])
+
+
+def measure(export) -> tuple[int, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = asyncio.run(export())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.dispose_engines()
+    return size, elapsed, peak
+
+
+def test_games_export(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'export.sqlite'}")
+    db.dispose_engines()
+
+    engine = db.get_engine()
+    SQLModel.metadata.create_all(engine)
+    games = [
+        {"league_id": LEAGUE_ID, **{name: game[field.alias or name] for name, field in api.Game.model_fields.items() if name != "league_id"}}
+        for game in games_with_points(count=400)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(db.League), [{"id": LEAGUE_ID, "zuluru_id": 1, "name": "Export"}])
+        connection.execute(insert(db.Game), games)
+
+    try:
+        list_size, list_time, list_peak = measure(export_list)
+        stream_size, stream_time, stream_peak = measure(export_stream)
+    finally:
+        db.dispose_engines()
+
+    print(f"\n{len(games)} games with points")
+    print(f"includePoints list: {list_size / 1e6:.1f} MB in {list_time * 1000:.0f}ms, peak {list_peak / 1e6:.1f} MB")
+    print(f"      ndjson stream: {stream_size / 1e6:.1f} MB in {stream_time * 1000:.0f}ms, peak {stream_peak / 1e6:.1f} MB")
+
+    assert stream_peak < list_peak / 4
@@ -0,0 +1,80 @@
+from httpx import ASGITransport, AsyncClient
+from pathlib import Path
+from sqlmodel import Session, SQLModel
+import asyncio
+import json
+import statistics
+import time
+
+from server.api import CURRENT_LEAGUE_ID
+from server.app import app, threadpool_size
+import server.cache as cache
+import server.db as db
+
+UPLOADS = 20
+STATS_REQUESTS = 200
+CONCURRENCY = 20
+
+
+def percentile(latencies, percent):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+
+async def timed(client, method, url, latencies, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    latencies.append(time.perf_counter() - start)
+    assert response.status_code < 300, response.text
+
+
+async def run_load(game):
+    upload_latencies: list[float] = []
+    stats_latencies: list[float] = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def limited(*args, **kwargs):
+        async with semaphore:
+            await timed(*args, **kwargs)
+
+    async with app.router.lifespan_context(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            requests = [limited(client, "POST", "/submit_game", upload_latencies, json=game) for _ in range(UPLOADS)]
+            requests += [limited(client, "GET", f"/api/{CURRENT_LEAGUE_ID}/stats", stats_latencies) for _ in range(STATS_REQUESTS)]
+
+            start = time.perf_counter()
+            await asyncio.gather(*requests)
+            elapsed = time.perf_counter() - start
+
+    return elapsed, upload_latencies, stats_latencies
+
+
+def test_concurrent_uploads_and_stats(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'load.sqlite'}")
+    db.dispose_engines()
+    cache.responses.clear()
+
+    engine = db.get_engine()
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(db.League(id=CURRENT_LEAGUE_ID, zuluru_id=1, name="Load"))
+        session.commit()
+
+    with open(Path(__file__).parents[1] / "data" / "mini_game.json") as f:
+        game = json.load(f)
+    game["league_id"] = CURRENT_LEAGUE_ID
+
+    try:
+        elapsed, uploads, stats = asyncio.run(run_load(game))
+    finally:
+        db.dispose_engines()
+
+    print(f"\n{UPLOADS} uploads and {STATS_REQUESTS} stats requests, {CONCURRENCY} at a time, {threadpool_size()} threads: {elapsed:.2f}s")
+    for name, latencies in [("submit_game", uploads), ("stats", stats)]:
+        median = statistics.median(latencies) * 1000
+        p99 = percentile(latencies, 99) * 1000
+        print(f"{name:>12}: p50 {median:.1f}ms  p99 {p99:.1f}ms  max {max(latencies) * 1000:.1f}ms")
+
+    assert len(uploads) == UPLOADS
+    assert len(stats) == STATS_REQUESTS
@@ -0,0 +1,27 @@
+from .synthetic import games_with_points
+from .test_serialization import best_time
+import json
+
+import server.api as api
+import server.points as points
+
+
+def test_points_codec():
+    season = [api.Game(**g).model_dump()["points"] for g in games_with_points()]
+
+    stored = [json.dumps(game_points).encode() for game_points in season]
+    json_time = best_time(lambda: [points.decode(data) for data in stored])
+    json_size = sum(map(len, stored))
+    print(f"\n{len(season)} games, json: {json_size / 1024:7.1f} KiB  decode {json_time * 1000:6.2f}ms")
+
+    for compression in points.COMPRESSIONS:
+        if compression == "zstd" and points.zstandard is None:
+            continue
+
+        encoded = [points.encode(game_points, "binary", compression) for game_points in season]
+        size = sum(map(len, encoded))
+        seconds = best_time(lambda: [points.decode(data) for data in encoded])
+        print(f"binary {compression:>4}: {size / 1024:7.1f} KiB ({json_size / size:4.1f}x smaller)  decode {seconds * 1000:6.2f}ms")
+
+        assert [points.decode(data) for data in encoded] == season
+        assert size < json_size / 3
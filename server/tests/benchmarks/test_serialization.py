@@ -0,0 +1,48 @@
+from .synthetic import games_with_points
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+import json
+import pytest
+import time
+
+import server.api as api
+import server.serialization as serialization
+
+
+def best_time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_serialize_games_with_points():
+    pytest.importorskip("orjson")
+
+    payload = games_with_points()
+    games = [api.Game(**g) for g in payload]
+    stored = [g.model_dump() for g in games]
+    adapter = TypeAdapter(list[api.Game])
+
+    timings = {
+        "build Game models": best_time(lambda: [api.Game(**g) for g in payload]),
+        "trusted game_json": best_time(lambda: [api.game_json(g) for g in stored]),
+        "jsonable_encoder + json.dumps": best_time(lambda: json.dumps(jsonable_encoder(games)).encode(), repeat=2),
+        "validate + dump_json (FastAPI)": best_time(lambda: adapter.dump_json(adapter.validate_python(games), by_alias=True)),
+        "pydantic models": best_time(lambda: serialization.dumps(games, "pydantic")),
+        "orjson models": best_time(lambda: serialization.dumps(games, "orjson")),
+        "pydantic dicts": best_time(lambda: serialization.dumps(payload, "pydantic")),
+        "orjson dicts": best_time(lambda: serialization.dumps(payload, "orjson")),
+    }
+
+    size = len(serialization.dumps(games))
+    print(f"\n{len(games)} games with points, {size / 1024:.0f} KiB")
+    for name, seconds in timings.items():
+        print(f"{name:>32}: {seconds * 1000:7.2f}ms")
+
+    assert json.loads(serialization.dumps(games, "orjson")) == json.loads(serialization.dumps(games, "pydantic"))
+    assert timings["orjson dicts"] < timings["pydantic models"]
+    assert timings["trusted game_json"] < timings["build Game models"]
+    assert json.loads(serialization.dumps([api.game_json(g) for g in stored])) == json.loads(serialization.dumps(games))
@@ -0,0 +1,35 @@
+from pathlib import Path
+import json
+import time
+
+from server.stats_calculator import StatsCalculator
+import server.db as db
+
+DATA_PATH = Path(__file__).parents[1] / "data"
+
+
+def load_points():
+    points = []
+    for fixture in sorted(DATA_PATH.glob("*.json")):
+        game = json.loads(fixture.read_text())
+        if "points" in game:
+            points.extend(game["points"])
+    return points
+
+
+def test_stats_calculator_throughput():
+    # every fixture game back to back, repeated into a very long game
+    points = load_points() * 500
+    events = sum(len(p["events"]) for p in points)
+
+    game = db.Game(id=1, points=points, league=db.League(id=1, stat_values="v2"))
+
+    best = float("inf")
+    for _ in range(3):
+        calculator = StatsCalculator(game)
+        start = time.perf_counter()
+        stats = calculator.calculate()
+        best = min(best, time.perf_counter() - start)
+
+    print(f"\n{len(points)} points, {events} events in {best:.3f}s ({events / best:,.0f} events/s)")
+    assert stats
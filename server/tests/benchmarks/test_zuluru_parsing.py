@@ -0,0 +1,48 @@
+from .test_serialization import best_time
+from contextlib import redirect_stdout
+from pathlib import Path
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+import io
+
+from server.zuluru_sync import ZuluruSync
+import server.db as db
+
+PAGES = Path(__file__).parents[1] / "data" / "zuluru"
+
+
+def test_parse_zuluru_pages():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    league = db.League(id=1, zuluru_id=1, name="Zuluru")
+
+    # a league's worth of team pages
+    team_pages = [(path, path.read_bytes()) for path in sorted(PAGES.glob("team_*.html"))] * 6
+    schedule_page = (PAGES / "schedule.html").read_bytes()
+    teams = {101: 1, 102: 2, 103: 3, 104: 4}
+
+    results = {}
+    print(f"\n{len(team_pages)} team pages and a schedule")
+    for parser in ["html.parser", "lxml"]:
+        for targeted in [False, True]:
+            sync = ZuluruSync(session, league, parser=parser)
+            if not targeted:
+                sync.team_only = None
+                sync.schedule_only = None
+
+            def parse():
+                with redirect_stdout(io.StringIO()):
+                    rosters = [sync.parse_team(101, page) for _, page in team_pages]
+                    schedule = sync.parse_schedule(schedule_page, teams)
+                return rosters, [(m.week, m.home_team_id, m.away_team_id, m.game_start) for m in schedule]
+
+            name = f"{parser}{' + SoupStrainer' if targeted else ''}"
+            results[name] = parse()
+            print(f"{name:>27}: {best_time(parse) * 1000:7.2f}ms")
+
+    session.close()
+
+    expected = results["html.parser"]
+    assert len(expected[1]) == 20
+    assert all(result == expected for result in results.values())
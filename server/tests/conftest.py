@@ -1,5 +1,8 @@
+from .helpers import ZuluruServer
 from fastapi.testclient import TestClient
 from multiprocessing import Process
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
 from typing import Generator
 import json
@@ -12,6 +15,7 @@ import uvicorn
 
 from server.api import CURRENT_LEAGUE_ID
 from server.app import app
+import server.cache as cache
 import server.db as db
 
 logging.basicConfig()
@@ -25,8 +29,12 @@ def session_fixture():
     engine = create_engine("sqlite:///test.sqlite")
     SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
+    db.set_engine(engine)
+    # connections can't be pooled across the event loops TestClient starts
+    db.set_async_engine(create_async_engine("sqlite+aiosqlite:///test.sqlite", poolclass=NullPool))
     with Session(engine) as session:
         yield session
+    db.dispose_engines()
 
 
 @pytest.fixture(name="server", scope="function")
@@ -57,6 +65,7 @@ def client_fixture(session: Session):
         return session
 
     app.dependency_overrides[db.get_session] = get_session_override
+    cache.responses.clear()
 
     client = TestClient(app)
     yield client
@@ -130,3 +139,13 @@ def matchup_fixture(session, league, rosters):
     session.commit()
 
     return matchup
+
+
+@pytest.fixture(name="zuluru_server", scope="function")
+def zuluru_server_fixture(monkeypatch):
+    """Local server for the saved Zuluru pages, logged in as a test user."""
+    monkeypatch.setenv("ZULURU_USER", "test")
+    monkeypatch.setenv("ZULURU_PASSWORD", "test")
+
+    with ZuluruServer(delay=0.05) as server:
+        yield server
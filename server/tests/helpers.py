@@ -1,8 +1,14 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from sqlalchemy import event
+from sqlmodel import select
+import hashlib
 import json
+import threading
+import time
 
 from server.api import CURRENT_LEAGUE_ID
+import server.db as db
 
 
 def upload_game(client, data_file):
@@ -25,19 +31,110 @@ def get_stats(client):
     return stats
 
 
+def stored_totals(session):
+    """The materialized totals, for comparing with a rebuild."""
+    session.expire_all()
+    season = session.exec(select(db.PlayerSeasonStats).order_by(db.PlayerSeasonStats.player_id)).all()
+    weeks = session.exec(select(db.PlayerWeekStats).order_by(db.PlayerWeekStats.player_id, db.PlayerWeekStats.week)).all()
+    return [row.model_dump(exclude={"id"}) for row in season + weeks]
+
+
 class QueryCounter(object):
     """Context manager to count SQLALchemy queries."""
 
     def __init__(self, connection):
-        self.connection = connection.engine
+        # async routes query through the async engine for the same database
+        self.engines = [connection.engine, db.get_async_engine().sync_engine]
         self.count = 0
+        self.statements = []
 
     def __enter__(self):
-        event.listen(self.connection, "before_cursor_execute", self.callback)
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self.callback)
         return self
 
     def __exit__(self, *args, **kwargs):
-        event.remove(self.connection, "before_cursor_execute", self.callback)
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self.callback)
 
-    def callback(self, *args, **kwargs):
+    def callback(self, conn, cursor, statement, *args, **kwargs):
         self.count += 1
+        self.statements.append(statement)
+
+
+class ZuluruServer(object):
+    """Serves the saved Zuluru pages in data/zuluru from a local HTTP server.
+
+    Each request waits `delay` seconds to stand in for the network and the
+    server tracks how many requests were in flight at once. Tests can change
+    `pages` to change what is served. With `etags` responses carry an ETag
+    and matching conditional requests get a 304.
+    """
+
+    def __init__(self, delay: float = 0, etags: bool = False):
+        self.delay = delay
+        self.etags = etags
+        self.requests: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        data = Path(__file__).parent / "data" / "zuluru"
+        self.pages = {
+            "/user/login": (data / "login.html").read_bytes(),
+            "/zuluru/leagues/view/league:1": (data / "league.html").read_bytes(),
+            "/zuluru/leagues/schedule": (data / "schedule.html").read_bytes(),
+        }
+        for page in data.glob("team_*.html"):
+            self.pages[f"/zuluru/teams/view/team:{page.stem.removeprefix('team_')}"] = page.read_bytes()
+
+    def __enter__(self):
+        zuluru = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                zuluru.respond(self)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                zuluru.respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def respond(self, handler):
+        with self.lock:
+            self.requests.append(handler.path)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(self.delay)
+        body = self.pages.get(handler.path.split("?")[0])
+        etag = f'"{hashlib.sha1(body).hexdigest()}"' if self.etags and body else None
+
+        if etag and handler.headers.get("If-None-Match") == etag:
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+        else:
+            handler.send_response(200 if body else 404)
+            handler.send_header("Content-Type", "text/html; charset=utf-8")
+            if etag:
+                handler.send_header("ETag", etag)
+            body = body or b"Not Found"
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+
+        with self.lock:
+            self.in_flight -= 1
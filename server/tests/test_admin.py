@@ -1,6 +1,14 @@
-from .helpers import get_stats, upload_game
+from .helpers import get_stats, stored_totals, upload_game
 from pathlib import Path
+from sqlmodel import Session, select
 import json
+import threading
+
+from server.api import CURRENT_LEAGUE_ID, UploadedGame
+import server.aggregates as aggregates
+import server.api as api
+import server.cache as cache
+import server.db as db
 
 
 def test_auth(client):
@@ -43,6 +51,66 @@ def test_edit(client, league, rosters, monkeypatch, snapshot):
     assert stats == snapshot
 
 
+def test_edit_only_recalculates_edited_game(client, session, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    other_stats = session.exec(select(db.Stats.id).where(db.Stats.game_id == 2)).all()
+
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    edit_game(client, league, 1, "mini_game_edited.json")
+
+    assert session.exec(select(db.Stats.id).where(db.Stats.game_id == 2)).all() == other_stats
+
+    stats = get_stats(client)
+    assert stats["stats"]["Scott Higgins"]["pulls"] == 1
+
+    # repeated edits leave exactly the totals a rebuild would
+    edit_game(client, league, 2, "mini_game_edited.json")
+    edit_game(client, league, 1, "mini_game.json")
+    edit_game(client, league, 1, "mini_game_edited.json")
+
+    totals = stored_totals(session)
+    aggregates.rebuild(session, league.id)
+    assert totals == stored_totals(session)
+
+
+def test_edit_during_upload(client, session, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+
+    with open(Path(__file__).parent / "data" / "mini_game.json") as f:
+        uploaded = UploadedGame(**{**json.load(f), "league_id": CURRENT_LEAGUE_ID, "week": 2})
+
+    def upload():
+        with Session(session.get_bind()) as other:
+            api.upload_game(other, uploaded)
+
+    # another worker uploads a game for the same players while the edit is updating the totals
+    refresh_players = aggregates.refresh_players
+    uploads: list[threading.Thread] = []
+
+    def interleaved(session, league_id, player_ids):
+        if not uploads:
+            uploads.append(threading.Thread(target=upload))
+            uploads[0].start()
+            uploads[0].join(timeout=0.5)
+        return refresh_players(session, league_id, player_ids)
+
+    monkeypatch.setattr(aggregates, "refresh_players", interleaved)
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    edit_game(client, league, 1, "mini_game.json")
+    uploads[0].join()
+
+    session.expire_all()
+    stats = get_stats(client)
+
+    aggregates.rebuild(session, league.id)
+    session.commit()
+    cache.responses.clear()
+    assert stats == get_stats(client)
+    assert stats["stats"]["Brian Kells"]["pulls"] == 2
+
+
 def test_delete(client, league, rosters, monkeypatch, snapshot):
     upload_game(client, "mini_game.json")
 
@@ -0,0 +1,158 @@
+from .helpers import stored_totals, upload_game
+from pathlib import Path
+from sqlalchemy import literal
+from sqlmodel import Session, col, select
+import json
+import sqlalchemy
+
+from server.api import CURRENT_LEAGUE_ID
+import server.aggregates as aggregates
+import server.api as api
+import server.db as db
+
+
+def load_game(data_file):
+    fixture_path = Path(__file__).parent / "data" / data_file
+
+    with open(fixture_path) as f:
+        game = json.load(f)
+
+    game["league_id"] = CURRENT_LEAGUE_ID
+    return game
+
+
+def rollup(session, week):
+    """Stats computed from scratch for comparison with the totals."""
+    statement = select(db.Game).where(db.Game.league_id == CURRENT_LEAGUE_ID).order_by(col(db.Game.week).asc(), col(db.Game.id).asc())
+    if week:
+        statement = statement.where(db.Game.week == week)
+    games = session.exec(statement).all()
+    return api.WeekStats(week=week, stats=api.build_stats(session, CURRENT_LEAGUE_ID, games))
+
+
+def assert_totals_match(session, weeks):
+    session.expire_all()
+    for week in [0] + weeks:
+        assert api.build_stats_response(session, CURRENT_LEAGUE_ID, week) == rollup(session, week)
+
+
+def test_totals(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+    assert_totals_match(session, [1])
+
+    # players switch teams in week 2
+    game = load_game("mini_game.json")
+    game["week"] = 2
+    game["homeTeam"], game["awayTeam"] = game["awayTeam"], game["homeTeam"]
+    response = client.post("/submit_game", json=game)
+    assert response.status_code == 201
+    assert_totals_match(session, [1, 2])
+
+    stats = api.build_stats_response(session, CURRENT_LEAGUE_ID, 0).stats
+    assert stats["Brian Kells"].team == "99 Problems"
+
+    aggregates.rebuild(session, CURRENT_LEAGUE_ID)
+    assert_totals_match(session, [1, 2])
+
+
+def test_totals_after_delete(client, session, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+
+    game = load_game("mini_game.json")
+    game["week"] = 2
+    game["homeTeam"], game["awayTeam"] = game["awayTeam"], game["homeTeam"]
+    client.post("/submit_game", json=game)
+
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    response = client.delete(f"/api/{league.id}/games/2", auth=("admin", "testpw"))
+    assert response.status_code == 200
+
+    assert_totals_match(session, [1, 2])
+
+    stats = api.build_stats_response(session, CURRENT_LEAGUE_ID, 0).stats
+    assert stats["Brian Kells"].team == "Kells Angels Bicycle Club"
+    assert api.build_stats_response(session, CURRENT_LEAGUE_ID, 2).stats == {}
+
+
+def test_totals_after_week_change(client, session, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    edited = load_game("mini_game_edited.json")
+    edited["week"] = 3
+
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    response = client.post(f"/api/{league.id}/games/1", json=edited, auth=("admin", "testpw"))
+    assert response.status_code == 200
+
+    assert_totals_match(session, [1, 3])
+    assert "Brian Kells" not in api.build_stats_response(session, CURRENT_LEAGUE_ID, 1).stats
+
+
+def test_totals_equal_rebuild_after_edits_and_deletes(client, session, league, rosters, monkeypatch):
+    for data_file in ["mini_game.json", "mini_game2.json", "callahan.json", "half.json", "turnovers.json"]:
+        upload_game(client, data_file)
+
+    game = load_game("mini_game2.json")
+    game["week"] = 2
+    client.post("/submit_game", json=game)
+
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    edited = load_game("mini_game_edited.json")
+    for game_id, week in [(1, 1), (2, 3), (1, 2), (2, 1)]:
+        edited["week"] = week
+        response = client.post(f"/api/{league.id}/games/{game_id}", json=edited, auth=("admin", "testpw"))
+        assert response.status_code == 200
+
+    for game_id in [3, 6]:
+        response = client.delete(f"/api/{league.id}/games/{game_id}", auth=("admin", "testpw"))
+        assert response.status_code == 200
+
+    totals = stored_totals(session)
+    aggregates.rebuild(session, CURRENT_LEAGUE_ID)
+    assert totals == stored_totals(session)
+
+
+def test_sum_stats(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    game = load_game("mini_game.json")
+    game["week"] = 2
+    game["homeTeam"], game["awayTeam"] = game["awayTeam"], game["homeTeam"]
+    client.post("/submit_game", json=game)
+
+    for week in [0, 1, 2]:
+        totals = aggregates.sum_stats(session, CURRENT_LEAGUE_ID, week)
+        stats = {player.name: api.stats_from_totals(db.StatTotals(**data)) for data, player in totals}
+        assert stats == rollup(session, week).stats
+
+
+def test_totals_not_built(client, session, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    # a league from before the totals existed, or partway through being built
+    session.execute(sqlalchemy.delete(db.LeagueTotals))
+    session.execute(sqlalchemy.delete(db.PlayerSeasonStats).where(col(db.PlayerSeasonStats.id) % 2 == 0))
+    session.commit()
+    assert not aggregates.totals_built(session, CURRENT_LEAGUE_ID)
+    with Session(session.get_bind()) as other:
+        assert_totals_match(other, [1])
+
+    # the next change builds them
+    monkeypatch.setenv("PARITY_EDIT_PASSWORD", "testpw")
+    response = client.post(f"/api/{league.id}/games/1", json=load_game("mini_game_edited.json"), auth=("admin", "testpw"))
+    assert response.status_code == 200
+
+    assert aggregates.totals_built(session, CURRENT_LEAGUE_ID)
+    assert_totals_match(session, [1])
+
+
+def test_round_div(session):
+    for numerator in range(-60, 61):
+        for denominator in [0, 1, 2, 3, 4, 8]:
+            result = session.execute(sqlalchemy.select(aggregates.round_div(literal(numerator), literal(denominator)))).scalar()
+            expected = round(numerator / denominator) if denominator else 0
+            assert result == expected, (numerator, denominator)
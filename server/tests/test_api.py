@@ -1,7 +1,12 @@
 from .helpers import QueryCounter, upload_game
 from datetime import datetime, time, timedelta
+import asyncio
+import json
 
 from server.api import CURRENT_LEAGUE_ID
+import server.aggregates as aggregates
+import server.api as api
+import server.cache as cache
 import server.db as db
 
 
@@ -99,22 +104,71 @@ def test_api_endpoints(client, league, rosters):
     assert len(resp_json["stats"]) == 48
 
 
+def test_trusted_reads(client, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+
+    paths = [f"/api/{CURRENT_LEAGUE_ID}/games", f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true", f"/api/{CURRENT_LEAGUE_ID}/games/1"]
+    trusted = [client.get(path).json() for path in paths]
+
+    monkeypatch.setenv("PARITY_TRUSTED_READS", "false")
+    cache.responses.clear()
+    assert [client.get(path).json() for path in paths] == trusted
+
+    assert client.get(f"/api/{CURRENT_LEAGUE_ID}/games/2").status_code == 404
+
+
+def test_games_with_points_are_built_in_the_threadpool(client, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+
+    loops = []
+    build = api.build_games_with_points_response
+
+    def build_games_with_points_response(session, league_id):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return build(session, league_id)
+
+    monkeypatch.setattr(api, "build_games_with_points_response", build_games_with_points_response)
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true")
+    assert response.status_code == 200
+    assert len(response.json()[0]["points"]) == 4
+    assert loops == [None]
+
+
+def test_games_export(client, league, rosters):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/games.ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true").json()
+
+    response = client.get("/api/1/games.ndjson")
+    assert response.status_code == 200
+    assert response.text == ""
+
+
 def test_query_count(client, session, league, rosters):
     """Test Database Query counts.
 
     Whenever an ORM is involved I find tests of this format to
     be useful. it helps ensure we don't have N+1 queries
-
-    Note that upload has a lot of queries because it creates
-    players on demand.
     """
+    # totals are built once, by the league's first upload
+    aggregates.rebuild(session, CURRENT_LEAGUE_ID)
+
     with QueryCounter(session.connection()) as counter:
         upload_game(client, "mini_game.json")
-        assert counter.count == 113
+        assert counter.count == 20
 
     with QueryCounter(session.connection()) as counter:
         upload_game(client, "mini_game2.json")
-        assert counter.count == 68
+        assert counter.count == 18
 
     # leagues
     with QueryCounter(session.connection()) as counter:
@@ -129,12 +183,12 @@ def test_query_count(client, session, league, rosters):
     # players
     with QueryCounter(session.connection()) as counter:
         client.get(f"/api/{CURRENT_LEAGUE_ID}/players")
-        assert counter.count == 6
+        assert counter.count == 4
 
     # games
     with QueryCounter(session.connection()) as counter:
         client.get(f"/api/{CURRENT_LEAGUE_ID}/games")
-        assert counter.count == 1
+        assert counter.count == 2
 
     # game
     with QueryCounter(session.connection()) as counter:
@@ -144,14 +198,34 @@ def test_query_count(client, session, league, rosters):
     # weeks
     with QueryCounter(session.connection()) as counter:
         client.get(f"/api/{CURRENT_LEAGUE_ID}/weeks")
-        assert counter.count == 1
+        assert counter.count == 2
 
     # week stats
     with QueryCounter(session.connection()) as counter:
         client.get(f"/api/{CURRENT_LEAGUE_ID}/weeks/1")
-        assert counter.count == 4
+        assert counter.count == 3
 
     # all stats
     with QueryCounter(session.connection()) as counter:
         client.get(f"/api/{CURRENT_LEAGUE_ID}/stats")
-        assert counter.count == 4
+        assert counter.count == 3
+
+
+def test_points_not_loaded(client, session, league, rosters):
+    """The points column is large so list views shouldn't select it."""
+    upload_game(client, "mini_game.json")
+
+    with QueryCounter(session.connection()) as counter:
+        response = client.get(f"/api/{CURRENT_LEAGUE_ID}/games")
+        assert response.json()[0]["points"] is None
+
+        client.get(f"/api/{CURRENT_LEAGUE_ID}/stats")
+        client.get(f"/api/{CURRENT_LEAGUE_ID}/players")
+
+    assert not [s for s in counter.statements if "game.points" in s]
+
+    with QueryCounter(session.connection()) as counter:
+        response = client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true")
+        assert len(response.json()[0]["points"]) == 4
+
+    assert [s for s in counter.statements if "game.points" in s]
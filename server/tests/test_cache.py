@@ -0,0 +1,107 @@
+from .helpers import QueryCounter, get_stats, upload_game
+from sqlmodel import Session
+
+from server.api import CURRENT_LEAGUE_ID
+from server.cache import ResponseCache
+import server.cache as cache
+import server.db as db
+
+
+def test_stats_are_cached(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+    stats = get_stats(client)
+
+    # only the version is queried
+    with QueryCounter(session.connection()) as counter:
+        assert get_stats(client) == stats
+        assert counter.count == 1
+
+    upload_game(client, "mini_game2.json")
+    assert len(get_stats(client)["stats"]) == len(stats["stats"]) + 24
+
+
+def test_version_is_shared_between_workers(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+    get_stats(client)
+
+    # another worker writes to the database
+    with Session(session.get_bind()) as other_session:
+        cache.bump_version(other_session, CURRENT_LEAGUE_ID)
+        other_session.commit()
+
+    # this worker's entry is keyed on the old version
+    with QueryCounter(session.connection()) as counter:
+        get_stats(client)
+        assert counter.count > 1
+
+
+def test_lru_eviction():
+    responses = ResponseCache(maxsize=2)
+    responses.set((1, 0, "a"), b"a")
+    responses.set((1, 0, "b"), b"b")
+    responses.get((1, 0, "a"))
+    responses.set((2, 0, "c"), b"c")
+
+    assert responses.get((1, 0, "a")) == b"a"
+    assert responses.get((1, 0, "b")) is None
+
+    responses.evict_league(1)
+    assert responses.get((1, 0, "a")) is None
+    assert responses.get((2, 0, "c")) == b"c"
+
+
+def test_etag(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    # only the version is queried and nothing is built
+    cache.responses.clear()
+    with QueryCounter(session.connection()) as counter:
+        response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert counter.count == 1
+
+    for path in ["players", "games", "weeks", "weeks/1"]:
+        response = client.get(f"/api/{CURRENT_LEAGUE_ID}/{path}")
+        assert response.status_code == 200
+        assert client.get(f"/api/{CURRENT_LEAGUE_ID}/{path}", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    upload_game(client, "mini_game2.json")
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_etag_changes_with_build(client, league, rosters, monkeypatch):
+    upload_game(client, "mini_game.json")
+
+    etag = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats").headers["etag"]
+    assert cache.BUILD_VERSION in etag
+    assert client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"If-None-Match": etag}).status_code == 304
+
+    # after a deploy the old ETag gets a full response
+    monkeypatch.setattr(cache, "BUILD_VERSION", "next")
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_archived_leagues_are_cacheable(client, session, league):
+    session.add(db.League(id=1, zuluru_id=100, name="Archived"))
+    session.commit()
+
+    response = client.get("/api/1/stats")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == f"public, max-age={cache.ARCHIVED_MAX_AGE}"
+    assert client.get("/api/1/stats", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    # leagues that don't exist yet (or at all) aren't cached
+    for league_id in [2, CURRENT_LEAGUE_ID + 1]:
+        response = client.get(f"/api/{league_id}/players")
+        assert response.headers["cache-control"] == "no-cache"
+
+    assert client.get(f"/api/{CURRENT_LEAGUE_ID}/stats").headers["cache-control"] == "no-cache"
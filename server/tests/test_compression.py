@@ -0,0 +1,94 @@
+from .helpers import upload_game
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+import pytest
+
+from server.api import CURRENT_LEAGUE_ID
+from server.compression import CompressionConfig, CompressionMiddleware, negotiate
+
+
+def test_stats_are_compressed(client, league, rosters):
+    upload_game(client, "mini_game.json")
+
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert "Brian Kells" in response.json()["stats"]
+
+    # the etag is weak but still revalidates
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    # uncompressed responses vary too so caches don't give them to clients that accept gzip
+    response = client.get(f"/api/{CURRENT_LEAGUE_ID}/stats", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_small_responses_are_not_compressed(client, league):
+    response = client.get("/api/leagues", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_encodings(encoding):
+    # the test client decodes these when the libraries are installed, zstandard is optional
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+
+    body = "parity " * 1000
+
+    async def stream(request):
+        async def chunks():
+            for _ in range(10):
+                yield body
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    async def plain(request):
+        return PlainTextResponse(body)
+
+    app = Starlette(routes=[Route("/stream", stream), Route("/plain", plain), Route("/skipped", plain)])
+    client = TestClient(CompressionMiddleware(app, routes={"/skipped": None}))
+
+    for path, expected in [("/plain", body), ("/stream", body * 10)]:
+        response = client.get(path, headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.text == expected
+
+    response = client.get("/stream", headers={"Accept-Encoding": encoding})
+    assert "content-length" not in response.headers
+
+    response = client.get("/skipped", headers={"Accept-Encoding": encoding})
+    assert "content-encoding" not in response.headers
+
+
+def test_minimum_size():
+    async def plain(request):
+        return PlainTextResponse("x" * 100)
+
+    app = Starlette(routes=[Route("/", plain)])
+
+    client = TestClient(CompressionMiddleware(app, CompressionConfig(minimum_size=101)))
+    assert "content-encoding" not in client.get("/", headers={"Accept-Encoding": "gzip"}).headers
+
+    client = TestClient(CompressionMiddleware(app, CompressionConfig(minimum_size=100)))
+    assert client.get("/", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+
+
+def test_negotiate():
+    encodings = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br, zstd", encodings) == "zstd"
+    assert negotiate("gzip, deflate, br", encodings) == "br"
+    assert negotiate("gzip, br;q=0", encodings) == "gzip"
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("identity", encodings) is None
+    assert negotiate("", encodings) is None
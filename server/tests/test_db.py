@@ -0,0 +1,100 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+from sqlmodel import Session, create_engine
+import asyncio
+import pytest
+
+from server.app import app
+import server.db as db
+
+
+@pytest.fixture(autouse=True)
+def database_url(monkeypatch, tmp_path):
+    """Point DATABASE_URL at a temporary file and dispose the engines each test creates."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'engine.sqlite'}")
+    yield
+    db.dispose_engines()
+
+
+def test_engine_is_shared():
+    engine = db.get_engine()
+    assert db.get_engine() is engine
+    assert engine.pool.size() == 5
+
+    sessions = [next(db.get_session()) for _ in range(3)]
+    assert all(s.bind is engine for s in sessions)
+
+
+def test_set_engine(monkeypatch):
+    monkeypatch.setenv("PARITY_DB_POOL_SIZE", "2")
+
+    engine = db.get_engine()
+    assert engine.pool.size() == 2
+
+    replacement = create_engine("sqlite://")
+    db.set_engine(replacement)
+    assert db.get_engine() is replacement
+
+
+def test_sqlite_profile(monkeypatch):
+    monkeypatch.setenv("PARITY_SQLITE_PRAGMAS", "busy_timeout=1234")
+
+    with db.get_engine().connect() as connection:
+        pragmas = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in db.SQLITE_PROFILES["wal"]}
+
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1
+    assert pragmas["temp_store"] == 2
+    assert pragmas["busy_timeout"] == 1234
+
+
+def test_sqlite_default_profile(monkeypatch):
+    # a database that was opened with the wal profile stays in WAL mode until switched back
+    with db.get_engine().connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+    db.dispose_engines()
+
+    monkeypatch.setenv("PARITY_SQLITE_PROFILE", "default")
+    with db.get_engine().connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+
+
+def test_async_database_url():
+    assert db.async_database_url("sqlite:////srv/db.sqlite") == "sqlite+aiosqlite:////srv/db.sqlite"
+    assert db.async_database_url("sqlite://") == "sqlite+aiosqlite://"
+    assert db.async_database_url("postgres://parity:pw@host/parity") == "postgresql+asyncpg://parity:pw@host/parity"
+    assert db.async_database_url("postgresql+psycopg2://parity:pw@host/parity") == "postgresql+asyncpg://parity:pw@host/parity"
+
+
+def test_async_engine(monkeypatch):
+    monkeypatch.setenv("PARITY_DB_POOL_SIZE", "3")
+
+    engine = db.get_async_engine()
+    assert db.get_async_engine() is engine
+    assert engine.pool.size() == 3
+
+    async def journal_mode():
+        async with engine.connect() as connection:
+            result = await connection.exec_driver_sql("PRAGMA journal_mode")
+            return result.scalar()
+
+    assert asyncio.run(journal_mode()) == "wal"
+
+    asyncio.run(db.dispose_async_engines())
+
+
+def test_tables_are_created_on_startup():
+    # a database from before the cache and totals tables existed
+    engine = db.get_engine()
+    db.League.__table__.create(engine)  # type: ignore[attr-defined]
+    with Session(engine) as session:
+        session.add(db.League(id=1, zuluru_id=1, name="Old"))
+        session.commit()
+
+    with TestClient(app) as client:
+        assert client.get("/api/1/stats").status_code == 200
+
+    assert {"leagueversion", "leaguetotals", "playerseasonstats", "zulurupage"} <= set(inspect(engine).get_table_names())
+
+    # and nothing happens once they exist
+    db.create_tables(engine)
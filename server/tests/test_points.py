@@ -0,0 +1,78 @@
+from .helpers import upload_game
+from pathlib import Path
+from sqlalchemy import text
+import json
+import pytest
+
+from server.api import CURRENT_LEAGUE_ID, UploadedGame
+import server.cache as cache
+import server.migrate_points as migrate_points
+import server.points as points
+
+
+def stored_points(data_file: str) -> list:
+    with open(Path(__file__).parent / "data" / data_file) as f:
+        return UploadedGame(**{**json.load(f), "league_id": CURRENT_LEAGUE_ID}).model_dump()["points"]
+
+
+@pytest.mark.parametrize("compression", points.COMPRESSIONS)
+@pytest.mark.parametrize("data_file", ["mini_game.json", "mini_game2.json", "callahan.json", "half.json", "turnovers.json"])
+def test_round_trip(data_file, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    game_points = stored_points(data_file)
+    encoded = points.encode(game_points, "binary", compression)
+
+    assert encoded.startswith(points.MAGIC)
+    assert points.decode(encoded) == game_points
+    assert len(encoded) < len(json.dumps(game_points))
+
+
+def test_timestamps():
+    game_points = stored_points("mini_game.json")
+    events = game_points[0]["events"]
+
+    # web stat keeper timestamps
+    for i, event in enumerate(events):
+        event["timestamp"] = f"2025-05-01T19:0{i}:03.{i * 7:03}Z"
+    assert points.decode(points.encode(game_points, "binary")) == game_points
+
+    # anything else is kept as a string
+    events[0]["timestamp"] = "sometime"
+    encoded = points.encode(game_points, "binary")
+    assert encoded.startswith(points.MAGIC)
+    assert points.decode(encoded) == game_points
+
+
+def test_json_fallback():
+    game_points = stored_points("mini_game.json")
+
+    # points stored without validation can't be reproduced exactly
+    del game_points[0]["events"][0]["secondActor"]
+    encoded = points.encode(game_points, "binary")
+    assert points.decode(encoded) == game_points
+    assert not encoded.startswith(points.MAGIC)
+
+    assert points.encode(None) is None
+    assert points.decode(None) is None
+    assert points.decode('[{"a": 1}]') == [{"a": 1}]
+
+
+def test_migrate(client, session, league, rosters, monkeypatch):
+    monkeypatch.setenv("PARITY_POINTS_CODEC", "json")
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    expected = client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true").json()
+    json_size = migrate_points.stored_size(session)
+
+    monkeypatch.setenv("PARITY_POINTS_CODEC", "binary")
+    assert migrate_points.migrate(session) == 2
+
+    stored = session.execute(text("SELECT points FROM game")).scalars().all()
+    assert all(value.startswith(points.MAGIC) for value in stored)
+    assert migrate_points.stored_size(session) < json_size / 3
+
+    cache.responses.clear()
+    assert client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true").json() == expected
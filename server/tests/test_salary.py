@@ -0,0 +1,57 @@
+from .helpers import upload_game
+from sqlmodel import select
+
+from server.api import CURRENT_LEAGUE_ID
+import server.db as db
+import server.salary as salary
+
+
+def expected_salaries(session, salary_calc):
+    """Salaries computed from each Stats row's own pay and salary_per_point."""
+    stats = session.exec(select(db.Stats)).all()
+    salaries = {}
+
+    for player_id in {s.player_id for s in stats}:
+        player_stats = [s for s in stats if s.player_id == player_id]
+
+        if salary_calc == "pro_rate":
+            per_point = [s.salary_per_point for s in player_stats if s.points_played > 3]
+            if per_point:
+                salaries[player_id] = round(sum(per_point) / len(per_point) * 15)
+        else:
+            salaries[player_id] = 500000 + sum(s.pay for s in player_stats)
+
+    return salaries
+
+
+def test_salaries(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+    upload_game(client, "mini_game2.json")
+
+    for salary_calc in ["pro_rate", "sum"]:
+        league.salary_calc = salary_calc
+        session.add(league)
+        session.commit()
+
+        assert salary.calculate_salaries(session, league) == expected_salaries(session, salary_calc)
+
+
+def test_fallback_salaries(client, session, league, rosters):
+    upload_game(client, "mini_game.json")
+
+    league.salary_calc = "sum"
+    session.add(league)
+    session.commit()
+
+    players = salary.player_salaries(session, CURRENT_LEAGUE_ID)
+    calculated = salary.calculate_salaries(session, league)
+    assert len(players) == 48
+
+    for is_open in [True, False]:
+        salaries = [calculated[p.id] for p, _, _ in players if p.is_open == is_open and p.id in calculated]
+        average = round(sum(salaries) / (len(salaries) or 1))
+
+        for player, team_name, player_salary in players:
+            if player.is_open == is_open:
+                assert team_name == session.get(db.Team, player.team_id).name
+                assert player_salary == calculated.get(player.id, average)
@@ -0,0 +1,49 @@
+from .helpers import upload_game
+import json
+import pytest
+
+from server.api import CURRENT_LEAGUE_ID
+import server.api as api
+import server.cache as cache
+import server.serialization as serialization
+
+
+def test_backends_match(client, session, league, rosters):
+    pytest.importorskip("orjson")
+    upload_game(client, "mini_game.json")
+
+    stats = api.build_stats_response(session, CURRENT_LEAGUE_ID, 0)
+    game = api.build_game_response(session, CURRENT_LEAGUE_ID, 1)
+
+    for content in [stats, [game], {"nested": [game]}]:
+        orjson_content = serialization.dumps(content, "orjson")
+        assert orjson_content == serialization.dumps(content, "pydantic")
+
+    # camelCase aliases are kept
+    assert "homeTeam" in json.loads(serialization.dumps(game, "orjson"))
+
+
+def test_orjson_backend(client, league, rosters, monkeypatch):
+    pytest.importorskip("orjson")
+    upload_game(client, "mini_game.json")
+
+    expected = client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true").json()
+
+    monkeypatch.setenv("PARITY_JSON_BACKEND", "orjson")
+    assert serialization.json_backend() == "orjson"
+
+    cache.responses.clear()
+    assert client.get(f"/api/{CURRENT_LEAGUE_ID}/games?includePoints=true").json() == expected
+
+
+def test_json_backend(monkeypatch):
+    assert serialization.json_backend() == "pydantic"
+
+    monkeypatch.setenv("PARITY_JSON_BACKEND", "orjson")
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.json_backend() == "pydantic"
+    assert serialization.dumps({"a": 1}, "orjson") == b'{"a":1}'
+
+    monkeypatch.setenv("PARITY_JSON_BACKEND", "ujson")
+    with pytest.raises(ValueError):
+        serialization.json_backend()
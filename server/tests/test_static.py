@@ -0,0 +1,86 @@
+import brotli
+import gzip
+import pytest
+
+from server.static import IMMUTABLE, NO_CACHE, StaticIndex, precompress
+import server.app
+
+
+@pytest.fixture(name="build")
+def build_fixture(tmp_path, monkeypatch):
+    """A small React build served in place of web/build."""
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<html>" + "app " * 500 + "</html>")
+    (tmp_path / "assets" / "index-abc123.js").write_text("console.log('parity');" * 200)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(2000))
+    (tmp_path.parent / "secret.txt").write_text("secret")
+
+    precompress(tmp_path)
+    monkeypatch.setattr(server.app, "react_app", StaticIndex(tmp_path))
+    return tmp_path
+
+
+def test_precompress(build):
+    assert (build / "index.html.gz").exists()
+    assert (build / "assets" / "index-abc123.js.gz").exists()
+    assert not (build / "logo.png.gz").exists()
+
+    assert gzip.decompress((build / "index.html.gz").read_bytes()) == (build / "index.html").read_bytes()
+    assert brotli.decompress((build / "index.html.br").read_bytes()) == (build / "index.html").read_bytes()
+
+
+def test_assets(client, build):
+    response = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == (build / "assets" / "index-abc123.js").read_text()
+
+    response = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert int(response.headers["content-length"]) == (build / "assets" / "index-abc123.js").stat().st_size
+
+    response = client.get("/logo.png")
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == NO_CACHE
+
+
+def test_index_fallback(client, build):
+    for path in ["/", "/stats", "/leagues/24/games", "/%2e%2e/secret.txt", "/..%2fsecret.txt"]:
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == NO_CACHE
+        assert response.text.startswith("<html>")
+
+
+def test_conditional_head_and_range(client, build):
+    response = client.get("/assets/index-abc123.js")
+    etag = response.headers["etag"]
+
+    response = client.get("/assets/index-abc123.js", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.head("/assets/index-abc123.js", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == b""
+    assert int(response.headers["content-length"]) > 0
+
+    response = client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity", "Range": "bytes=0-6"})
+    assert response.status_code == 206
+    assert response.text == "console"
+
+
+def test_compressed_without_precompressed_copy(client, build, monkeypatch):
+    (build / "manifest.json").write_text('{"name": "parity"}' * 100)
+    monkeypatch.setattr(server.app, "react_app", StaticIndex(build))
+
+    # compressed by the middleware, which weakens the etag
+    response = client.get("/manifest.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+
+    response = client.get("/manifest.json", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["vary"] == "Accept-Encoding"
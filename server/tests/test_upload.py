@@ -1,4 +1,6 @@
-from .helpers import get_stats, upload_game
+from .helpers import QueryCounter, get_stats, upload_game
+
+import server.aggregates as aggregates
 
 
 def test_basic_point(client, league, rosters, snapshot):
@@ -54,3 +56,21 @@ def test_turnovers(client, league, snapshot):
     upload_game(client, "turnovers.json")
     stats = get_stats(client)
     assert stats == snapshot
+
+
+def test_upload_query_count(client, session, league, rosters):
+    """Uploads use a fixed number of queries no matter how many players or events a game has.
+
+    Players are resolved with one select plus one insert for new players and
+    the totals of the game's players are deleted and summed again in SQL.
+    """
+    # totals are built once, by the league's first upload
+    aggregates.rebuild(session, league.id)
+
+    counts = {}
+    for data_file in ["mini_game.json", "mini_game2.json", "callahan.json", "half.json", "turnovers.json"]:
+        with QueryCounter(session.connection()) as counter:
+            upload_game(client, data_file)
+        counts[data_file] = counter.count
+
+    assert max(counts.values()) <= 20, counts
@@ -1,9 +1,14 @@
+from .helpers import QueryCounter
 from datetime import date, datetime, time
-from sqlmodel import select
+from sqlalchemy import event
+from sqlmodel import col, select
 from unittest import mock
+import pytest
+import re
 import textwrap
 
-from server.zuluru_sync import ZuluruSync
+from server.api import CURRENT_LEAGUE_ID
+from server.zuluru_sync import Changes, ZuluruSync
 import server.db as db
 
 
@@ -45,7 +50,10 @@ def test_sync_schedule(session, mocker):
 
     # mock requests.get to return our mock_html
     mock_response = mock.Mock()
+    mock_response.status_code = 200
+    mock_response.headers = {}
     mock_response.text = mock_html
+    mock_response.content = mock_html.encode()
     mocker.patch("requests.get", return_value=mock_response)
 
     # zuluru-sync
@@ -60,3 +68,152 @@ def test_sync_schedule(session, mocker):
     assert retrieved_matchups[0].away_team_id == team_b.id
     assert retrieved_matchups[0].game_start == datetime.combine(date(2025, 5, 22), time(18, 45))
     assert retrieved_matchups[0].game_end == datetime.combine(date(2025, 5, 22), time(20, 35))
+
+
+def test_sync_teams(session, league, zuluru_server):
+    changes = ZuluruSync(session, league, site_url=zuluru_server.url).sync_teams()
+    assert changes == {"teams": Changes(created=4), "players": Changes(created=47)}
+    assert str(changes["teams"]) == "4 created, 0 updated, 0 unchanged"
+
+    teams = session.exec(select(db.Team).where(db.Team.league_id == CURRENT_LEAGUE_ID)).all()
+    assert sorted(t.name for t in teams) == ["99 Problems", "Kells Angels Bicycle Club", "Soho", "lumleysexuals"]
+
+    # coaches are skipped and players on two teams end up on the last one
+    players = session.exec(select(db.Player).where(db.Player.league_id == CURRENT_LEAGUE_ID)).all()
+    assert len(players) == 47
+    assert all(p.team_id for p in players)
+    keates = next(p for p in players if p.name == "Christopher Keates")
+    assert keates.team_id == next(t.id for t in teams if t.name == "99 Problems")
+    assert len([p for p in players if p.gender == "female"]) == 16
+
+    # team pages were fetched at the same time
+    assert zuluru_server.max_in_flight > 1
+    assert len([path for path in zuluru_server.requests if "/teams/view/team:" in path]) == 4
+
+
+def test_sync_teams_diff(session, league, zuluru_server):
+    # skip the unchanged page checks
+    sync = ZuluruSync(session, league, site_url=zuluru_server.url, force=True)
+    sync.sync_teams()
+
+    soho = session.exec(select(db.Team).where(db.Team.name == "Soho")).one()
+    soho.name = "Old Name"
+    brian = session.exec(select(db.Player).where(db.Player.name == "Brian Kells")).one()
+    brian.gender = "female"
+    # no longer on the roster
+    former = db.Player(league_id=league.id, zuluru_id=1, name="Former Player", gender="male", team_id=soho.id)
+    session.add_all([soho, brian, former])
+    session.commit()
+
+    commits = []
+    event.listen(session, "after_commit", commits.append)
+    with QueryCounter(session.connection()) as counter:
+        changes = sync.sync_teams()
+
+    assert changes == {"teams": Changes(updated=1, unchanged=3), "players": Changes(updated=2, unchanged=46)}
+    assert len(commits) == 1
+    assert counter.count <= 7
+
+    session.refresh(soho)
+    session.refresh(brian)
+    session.refresh(former)
+    assert soho.name == "Soho"
+    assert brian.gender == "male"
+    assert former.team_id is None
+
+
+@pytest.mark.parametrize("etags", [True, False])
+def test_sync_teams_unchanged(session, league, zuluru_server, etags):
+    zuluru_server.etags = etags
+    ZuluruSync(session, league, site_url=zuluru_server.url).sync_teams()
+    assert len(session.exec(select(db.ZuluruPage)).all()) == 4
+
+    with QueryCounter(session.connection()) as counter:
+        changes = ZuluruSync(session, league, site_url=zuluru_server.url).sync_teams()
+
+    assert changes == {"teams": Changes(), "players": Changes()}
+    assert not [s for s in counter.statements if s.startswith(("INSERT", "UPDATE", "DELETE"))]
+
+    team_path = "/zuluru/teams/view/team:104"
+    zuluru_server.pages[team_path] = zuluru_server.pages[team_path].replace(b"<h2>Soho</h2>", b"<h2>Soho FC</h2>")
+
+    changes = ZuluruSync(session, league, site_url=zuluru_server.url).sync_teams()
+    assert changes == {"teams": Changes(updated=1), "players": Changes(unchanged=12)}
+    assert session.exec(select(db.Team).where(db.Team.zuluru_id == 104)).one().name == "Soho FC"
+
+
+def test_sync_schedule_unchanged_saves_etag(session, league, zuluru_server):
+    sync = ZuluruSync(session, league, site_url=zuluru_server.url)
+    sync.sync_teams()
+    sync.sync_schedule()
+
+    # the same schedule now comes with an ETag
+    zuluru_server.etags = True
+    assert ZuluruSync(session, league, site_url=zuluru_server.url).sync_schedule() == Changes()
+
+    schedule = session.exec(select(db.ZuluruPage).where(col(db.ZuluruPage.url).contains("schedule"))).one()
+    assert schedule.etag is not None
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_sync_schedule_page(session, league, zuluru_server, parser):
+    sync = ZuluruSync(session, league, site_url=zuluru_server.url, parser=parser)
+    sync.sync_teams()
+    sync.sync_schedule()
+
+    matchups = session.exec(select(db.Matchup).where(db.Matchup.league_id == league.id)).all()
+    assert len(matchups) == 20
+    assert sorted({m.week for m in matchups}) == list(range(1, 11))
+    assert matchups[0].game_start == datetime(2025, 5, 22, 18, 45)
+
+
+def test_parsers_agree(session, league, zuluru_server):
+    team_page = zuluru_server.pages["/zuluru/teams/view/team:101"]
+
+    full = ZuluruSync(session, league, parser="html.parser")
+    full.team_only = None
+    expected = full.parse_team(101, team_page)
+    assert len(expected[1]) == 12
+
+    for parser in ["html.parser", "lxml"]:
+        assert ZuluruSync(session, league, parser=parser).parse_team(101, team_page) == expected
+
+    # lxml is installed as a dependency so it is the default
+    assert ZuluruSync(session, league).parser == "lxml"
+
+
+def test_sync_schedule_diff(session, league, zuluru_server):
+    sync = ZuluruSync(session, league, site_url=zuluru_server.url)
+    sync.sync_teams()
+    assert sync.sync_schedule() == Changes(created=20, deleted=0)
+
+    def matchups():
+        return session.exec(select(db.Matchup).where(db.Matchup.league_id == league.id).order_by(db.Matchup.game_start)).all()
+
+    before = {m.game_start: m.id for m in matchups()}
+
+    schedule = zuluru_server.pages["/zuluru/leagues/schedule"]
+    # the first game ends earlier, the second starts later and the third is cancelled
+    schedule = schedule.replace(b'game=1000">6:45PM-8:35PM', b'game=1000">6:45PM-8:15PM')
+    schedule = schedule.replace(b'game=1001">8:35PM-10:25PM', b'game=1001">8:45PM-10:25PM')
+    schedule = re.sub(rb'<tr>\s*<td></td>\s*<td><a href="/zuluru/games/view\?game=1003">.*?</tr>', b"", schedule, flags=re.S)
+    zuluru_server.pages["/zuluru/leagues/schedule"] = schedule
+
+    commits = []
+    event.listen(session, "after_commit", commits.append)
+    with QueryCounter(session.connection()) as counter:
+        changes = sync.sync_schedule()
+
+    assert changes == Changes(created=1, updated=1, unchanged=17, deleted=2)
+    assert len(commits) == 1
+
+    # matchups are deleted by id after the new ones are inserted
+    writes = [s.split()[0] for s in counter.statements if s.startswith(("INSERT", "UPDATE", "DELETE"))]
+    assert writes == ["INSERT", "UPDATE", "DELETE", "INSERT"]
+
+    after = matchups()
+    assert len(after) == 19
+    assert after[0].id == before[after[0].game_start]
+    assert after[0].game_end == datetime(2025, 5, 22, 20, 15)
+    assert after[1].game_start == datetime(2025, 5, 22, 20, 45)
+    assert all(m.id == before[m.game_start] for m in after[2:])
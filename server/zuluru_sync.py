@@ -1,24 +1,74 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from pathlib import Path
-from sqlmodel import Session, create_engine, select
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, col, select
+from typing import Optional
+from urllib.parse import urlencode
 import getpass
+import hashlib
 import os
 import re
 import requests
+import sys
 
 from server.api import CURRENT_LEAGUE_ID
+import server.cache as cache
 import server.db as db
 
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+# lxml is a dependency and several times faster than the builtin parser,
+# html.parser is only a fallback for an environment without it
+PARSER = "lxml" if lxml is not None else "html.parser"
+
+# team pages downloaded at once
+FETCH_WORKERS = 8
+
+# INSERT ... ON CONFLICT for each supported database
+UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def upsert(session: Session):
+    return UPSERTS[session.get_bind().dialect.name]
+
+
+@dataclass
+class Changes:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # only the schedule deletes, teams and players that leave Zuluru are kept for their stats
+    deleted: Optional[int] = None
+
+    def __str__(self):
+        summary = f"{self.created} created, {self.updated} updated, {self.unchanged} unchanged"
+        if self.deleted is not None:
+            summary += f", {self.deleted} deleted"
+        return summary
+
 
 class ZuluruSync:
-    def __init__(self, session: Session, league: db.League, division=False):
+    def __init__(self, session: Session, league: db.League, division=False, site_url="https://www.ocua.ca", workers=FETCH_WORKERS, force=False, parser=PARSER):
         self.session = session
         self.league = league
         self.league_id = league.id
+        self.workers = workers
+        self.parser = parser
+
+        # pages seen by the last sync and the ones fetched since, by url
+        self.force = force
+        pages = session.exec(select(db.ZuluruPage.url, db.ZuluruPage.etag, db.ZuluruPage.last_modified, db.ZuluruPage.content_hash)).all()
+        self.pages = {url: (etag, last_modified, content_hash) for url, etag, last_modified, content_hash in pages}
+        self.page_updates: dict[str, tuple] = {}
 
-        self.base_url = "https://www.ocua.ca/zuluru"
-        self.login_url = "https://www.ocua.ca/user/login"
+        self.base_url = f"{site_url}/zuluru"
+        self.login_url = f"{site_url}/user/login"
 
         league_path = f"{self.base_url}/leagues/view/league:"
         division_path = f"{self.base_url}/divisions/view?division="
@@ -36,35 +86,88 @@ class ZuluruSync:
         self.team_id_preamble = "teams_team_"
         self.player_id_preamble = "people_person_"
 
-    def sync_schedule(self):
-        statement = select(db.Matchup).where(db.Matchup.league_id == self.league_id)
-        current_matchups = self.session.exec(statement).all()
-        for matchup in current_matchups:
-            self.session.delete(matchup)
-        self.session.commit()
+        # only the parts of each page that are read get parsed
+        self.team_list_only = SoupStrainer(id=re.compile(self.team_id_preamble + r"\d+"))
+        self.team_only = SoupStrainer(["h2", "table"])
+        self.schedule_only = SoupStrainer("div", attrs={"class": "schedule"})
+        self.login_only = SoupStrainer(attrs={"name": "form_build_id"})
 
+    def sync_schedule(self):
         matchups = self.load_schedule()
-        print(len(matchups), "games retrieved")
+        if matchups is None:
+            print("Schedule unchanged")
+            # the page can come back with new validators but the same content
+            self.save_pages()
+            self.session.commit()
+            return Changes()
 
-        for matchup in matchups:
-            self.session.add(matchup)
+        print(len(matchups), "games retrieved")
 
+        changes = self.write_schedule(matchups)
+        self.save_pages()
         self.session.commit()
 
+        print(f"matchups: {changes}")
+        return changes
+
+    def write_schedule(self, matchups):
+        """Apply the synced matchups to the league as a diff.
+
+        Matchups are keyed on (week, home, away, start). New ones are inserted
+        before missing ones are deleted and everything is written in the
+        current transaction so the schedule is never seen empty.
+        """
+        changes = Changes()
+
+        def key(matchup):
+            return matchup.week, matchup.home_team_id, matchup.away_team_id, matchup.game_start
+
+        wanted = {key(matchup): matchup for matchup in matchups}
+
+        current = self.session.exec(select(db.Matchup).where(db.Matchup.league_id == self.league_id)).all()
+        updates, deletes = [], []
+        for matchup in current:
+            synced = wanted.pop(key(matchup), None)
+            if synced is None:
+                deletes.append(matchup.id)
+            elif synced.game_end != matchup.game_end:
+                updates.append({"id": matchup.id, "game_end": synced.game_end})
+            else:
+                changes.unchanged += 1
+
+        inserts = [m.model_dump(exclude={"id"}) for m in wanted.values()]
+        changes.created = len(inserts)
+        changes.updated = len(updates)
+        changes.deleted = len(deletes)
+
+        if inserts:
+            self.session.execute(insert(db.Matchup), inserts)
+        if updates:
+            self.session.execute(update(db.Matchup), updates)
+        if deletes:
+            self.session.execute(delete(db.Matchup).where(col(db.Matchup.id).in_(deletes)))
+
+        return changes
+
     def load_schedule(self):
         print("Fetching schedule")
 
         league_params = {"league": self.league.zuluru_id}
-        page = requests.get(self.schedule_path, params=league_params)
-
-        soup = BeautifulSoup(page.text, "html.parser")
-
-        tbody = soup.find("div", {"class": "schedule"}).find("tbody")
+        page = self.fetch_page(requests, self.schedule_path, league_params)
+        if page is None:
+            return None
 
         teams = {}
         for team in self.session.exec(select(db.Team).where(db.Team.league_id == self.league_id)).all():
             teams[team.zuluru_id] = team.id
 
+        return self.parse_schedule(page, teams)
+
+    def parse_schedule(self, page, teams):
+        soup = BeautifulSoup(page, self.parser, parse_only=self.schedule_only)
+
+        tbody = soup.find("div", {"class": "schedule"}).find("tbody")
+
         schedule = []
         date = datetime.today().date()
         week = 0
@@ -113,47 +216,105 @@ class ZuluruSync:
 
         print(f"Found {len(team_ids)} Teams")
 
-        for x in team_ids:
-            self.sync_team(session, x)
+        # pages are downloaded in parallel, parsed, then written as one diff
+        pages = self.fetch_teams(session, team_ids)
+        rosters = {}
+        for zuluru_id, page in zip(team_ids, pages):
+            if page is None:
+                print(f"Team unchanged: {zuluru_id}")
+            else:
+                rosters[zuluru_id] = self.parse_team(zuluru_id, page)
+
+        changes = self.write_teams(rosters)
+        if any(counts.created or counts.updated for counts in changes.values()):
+            cache.bump_version(self.session, self.league_id)
+        self.save_pages()
+        self.session.commit()
+
+        for kind, counts in changes.items():
+            print(f"{kind}: {counts}")
+
+        return changes
 
     def get_team_ids(self, session):
-        soup = self.get_soup(session, self.teams_path)
+        soup = self.get_soup(session, self.teams_path, self.team_list_only)
         ids = [int(x.get("id").replace(self.team_id_preamble, "")) for x in soup.find_all(id=re.compile(self.team_id_preamble + r"\d+"))]
         return ids
 
-    def sync_team(self, session, zuluru_id):
-        print(f"Syncing Team: {zuluru_id}")
+    def fetch_teams(self, session, team_ids):
+        if not team_ids:
+            return []
 
-        soup = self.fetch_team(session, zuluru_id)
-        name = soup.find_all("h2")[-1].get_text()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(team_ids))) as executor:
+            return list(executor.map(lambda zuluru_id: self.fetch_team(session, zuluru_id), team_ids))
+
+    def fetch_team(self, session, zuluru_id):
+        print(f"Fetching Team: {zuluru_id}")
+        return self.fetch_page(session, self.team_path + str(zuluru_id))
+
+    def fetch_page(self, http, url, params=None):
+        """The page at url, or None if it hasn't changed since the last sync.
+
+        Sends the ETag and Last-Modified from the last sync and falls back to
+        comparing a hash of the content. Runs on the fetch workers so it only
+        reads the (etag, last_modified, content_hash) loaded up front.
+        """
+        key = f"{url}?{urlencode(params)}" if params else url
+        seen = None if self.force else self.pages.get(key)
+
+        headers = {}
+        if seen and seen[0]:
+            headers["If-None-Match"] = seen[0]
+        if seen and seen[1]:
+            headers["If-Modified-Since"] = seen[1]
+
+        response = http.get(url, params=params, headers=headers)
+        if seen and response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            return response.text
 
-        team = self.update_or_create_team(zuluru_id, name)
+        page = (response.headers.get("ETag"), response.headers.get("Last-Modified"), hashlib.sha256(response.content).hexdigest())
+        if page != seen:
+            self.page_updates[key] = page
 
-        self.reset_team_players(team)
-        self.sync_players(soup, team)
+        if seen and page[2] == seen[2]:
+            return None
+        return response.text
 
-    def fetch_team(self, session, zuluru_id):
-        page = self.team_path + str(zuluru_id)
-        soup = self.get_soup(session, page)
+    def save_pages(self):
+        """Record the pages fetched by this sync, in the current transaction."""
+        if not self.page_updates:
+            return
 
-        return soup
+        rows = [
+            {"url": url, "etag": etag, "last_modified": last_modified, "content_hash": content_hash}
+            for url, (etag, last_modified, content_hash) in self.page_updates.items()
+        ]
+        statement = upsert(self.session)(db.ZuluruPage).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[db.ZuluruPage.url],
+            set_={"etag": statement.excluded.etag, "last_modified": statement.excluded.last_modified, "content_hash": statement.excluded.content_hash},
+        )
+        self.session.execute(statement)
+        self.pages.update(self.page_updates)
+        self.page_updates = {}
 
-    def reset_team_players(self, team):
-        statement = select(db.Player).where(db.Player.team_id == team.id)
-        players = self.session.exec(statement).all()
+    def parse_team(self, zuluru_id, page):
+        """The team name and its roster as {zuluru_id: (name, gender)}."""
+        print(f"Parsing Team: {zuluru_id}")
 
-        for current_player in players:
-            current_player.team_id = None
-            self.session.add(current_player)
+        soup = BeautifulSoup(page, self.parser, parse_only=self.team_only)
+        name = soup.find_all("h2")[-1].get_text()
 
-        self.session.commit()
+        return name, self.parse_players(soup)
 
-    def sync_players(self, soup, team):
+    def parse_players(self, soup):
         player_elems = soup.find_all(id=re.compile(self.player_id_preamble + r"\d+"))
 
         if not player_elems:
             print("No players found. Login probably failed.")
-            return
+            return {}
 
         table = soup.find("table", {"class": "table-striped"})
 
@@ -170,6 +331,7 @@ class ZuluruSync:
         role_elems = table.find_all(string=re.compile(roles_regex))
         assert len(player_elems) == len(role_elems)
 
+        players = {}
         for p, r, g in zip(player_elems, role_elems, gender_elems):
             if r == "Non-playing coach":
                 continue
@@ -177,41 +339,74 @@ class ZuluruSync:
             zuluru_id = int(p.get("id").replace(self.player_id_preamble, ""))
             name = p.get_text()
             gender = "male" if g == "Open" else "female"
-            self.update_or_create_player(zuluru_id, name, gender, team)
-
-    def update_or_create_team(self, zuluru_id, name):
-        statement = select(db.Team).where(db.Team.league_id == self.league_id, db.Team.zuluru_id == zuluru_id)
-        instance = self.session.exec(statement).first()
-
-        if instance:
-            print(f"Updating Team: {name}")
-        else:
-            print(f"Creating Team: {name}")
-            instance = db.Team(league_id=self.league_id, zuluru_id=zuluru_id)
-
-        instance.name = name
-
-        self.session.add(instance)
-        self.session.commit()
-
-        return instance
+            players[zuluru_id] = (name, gender)
+
+        return players
+
+    def write_teams(self, rosters):
+        """Apply the synced teams and rosters to the league as a diff.
+
+        Everything is written in the current transaction. Players on a synced
+        team who are no longer on its roster are released from the team and
+        players on more than one roster end up on the last one.
+        """
+        team_changes = Changes()
+        player_changes = Changes()
+
+        team_rows = self.session.exec(select(db.Team.zuluru_id, db.Team.id, db.Team.name).where(db.Team.league_id == self.league_id)).all()
+        teams = {zuluru_id: id for zuluru_id, id, _ in team_rows}
+        current_names = {zuluru_id: name for zuluru_id, _, name in team_rows}
+
+        upserts = []
+        for zuluru_id, (name, _) in rosters.items():
+            if zuluru_id not in teams:
+                team_changes.created += 1
+            elif current_names[zuluru_id] != name:
+                team_changes.updated += 1
+            else:
+                team_changes.unchanged += 1
+                continue
+            upserts.append({"league_id": self.league_id, "zuluru_id": zuluru_id, "name": name})
+
+        if upserts:
+            statement = upsert(self.session)(db.Team).values(upserts)
+            statement = statement.on_conflict_do_update(index_elements=[db.Team.zuluru_id], set_={"name": statement.excluded.name})
+            teams.update({zuluru_id: id for id, zuluru_id in self.session.execute(statement.returning(db.Team.id, db.Team.zuluru_id))})
+
+        roster = {}
+        for zuluru_id, (_, players) in rosters.items():
+            for player_id, (name, gender) in players.items():
+                roster[player_id] = {"name": name, "gender": gender, "team_id": teams[zuluru_id]}
+
+        synced_team_ids = {teams[zuluru_id] for zuluru_id in rosters}
+        player_rows = self.session.exec(
+            select(db.Player.id, db.Player.zuluru_id, db.Player.name, db.Player.gender, db.Player.team_id).where(db.Player.league_id == self.league_id)
+        ).all()
+
+        updates = []
+        for id, zuluru_id, name, gender, team_id in player_rows:
+            if zuluru_id in roster:
+                wanted = roster.pop(zuluru_id)
+            elif team_id in synced_team_ids:
+                wanted = {"name": name, "gender": gender, "team_id": None}
+            else:
+                continue
 
-    def update_or_create_player(self, zuluru_id, name, gender, team):
-        statement = select(db.Player).where(db.Player.league_id == self.league_id, db.Player.zuluru_id == zuluru_id)
-        instance = self.session.exec(statement).first()
+            if wanted == {"name": name, "gender": gender, "team_id": team_id}:
+                player_changes.unchanged += 1
+            else:
+                player_changes.updated += 1
+                updates.append({"id": id, **wanted})
 
-        if instance:
-            print(f"Updating Player: {name}")
-        else:
-            print(f"Creating Player: {name}")
-            instance = db.Player(league_id=self.league_id, zuluru_id=zuluru_id)
+        inserts = [{"league_id": self.league_id, "zuluru_id": zuluru_id, **player} for zuluru_id, player in roster.items()]
+        player_changes.created = len(inserts)
 
-        instance.name = name
-        instance.gender = gender
-        instance.team_id = team.id
+        if updates:
+            self.session.execute(update(db.Player), updates)
+        if inserts:
+            self.session.execute(insert(db.Player), inserts)
 
-        self.session.add(instance)
-        self.session.commit()
+        return {"teams": team_changes, "players": player_changes}
 
     def login(self):
         username = os.environ.get("ZULURU_USER") or self.get_user()
@@ -219,7 +414,11 @@ class ZuluruSync:
 
         # Extract nonce
         session = requests.Session()
-        soup = self.get_soup(session, self.login_url)
+        # enough pooled connections for every fetch worker
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        soup = self.get_soup(session, self.login_url, self.login_only)
         nonce = soup.find(attrs={"name": "form_build_id"}).get("value")
 
         # Authenticate
@@ -240,20 +439,19 @@ class ZuluruSync:
         print("Username:")
         return input()
 
-    def get_soup(self, session, url):
-        return BeautifulSoup(session.get(url).text, "html.parser")
+    def get_soup(self, session, url, parse_only=None):
+        return BeautifulSoup(session.get(url).text, self.parser, parse_only=parse_only)
 
 
 if __name__ == "__main__":
-    db_path = Path(__file__).parent / "db.sqlite"
-    db_uri = "sqlite:////" + str(db_path.absolute())
-    engine = create_engine(db_uri)
+    db.create_tables()
 
-    with Session(engine) as session:
+    with Session(db.get_engine()) as session:
         league = session.get(db.League, CURRENT_LEAGUE_ID)
         assert league
         division = False
+        force = "--force" in sys.argv
 
-        zuluru_sync = ZuluruSync(session, league, division)
+        zuluru_sync = ZuluruSync(session, league, division, force=force)
         zuluru_sync.sync_teams()
         zuluru_sync.sync_schedule()